@@ -1,5 +1,7 @@
 from google.adk.agents.llm_agent import Agent
 
+from .routing import decision_criteria, valid_actions
+
 client_communication = Agent(
     model="gemini-2.5-flash",
     name="client_communication",
@@ -574,7 +576,7 @@ agent_coordinator = Agent(
 You are the Agent Orchestrator. Your role is to receive a Legal Case input and decide which sub-agent to delegate it to.
 
 Your available sub-agents are:
-- client_communicator
+- client_communication
 - legal_researcher
 - voice_bot_scheduler
 - evidence_sorter_initial
@@ -588,29 +590,9 @@ Each legal case input will end with an indicator formatted as:
 ---
 ### DECISION CRITERIA
 
-1. If the case includes the keyword "Action: Sort"
-   → Transfer the input (excluding the "Action:" line) to the "evidence_sorter" sub-agent.
-
-2. If the case includes the keyword "Action: Sort_Initial"
-   → Transfer the input (excluding the "Action:" line) to the "evidence_sorter_initial" sub-agent.
-
-3. If the case includes the keyword "Action: Email"
-   → Transfer the input (excluding the "Action:" line) to the "client_communicator" sub-agent.
-
-4. If the case includes the keyword "Action: Wraggler1"
-   → Transfer the input (excluding the "Action:" line) to the "evidence_sorter_1" sub-agent.
-
-5. If the case includes the keyword "Action: Wraggler2"
-   → Transfer the input (excluding the "Action:" line) to the "evidence_sorter_2" sub-agent.
-
-6. If the case includes the keyword "Action: Wraggler3"
-   → Transfer the input (excluding the "Action:" line) to the "evidence_sorter_3" sub-agent.
-
-7. If the case includes the keyword "Action: Legal"
-   → Transfer the input (excluding the "Action:" line) to the "evidence_sorter_3" sub-agent.
-
-8. If no Action keyword is provided, assume the default action is:
-   → "Sort_Initial", and automatically transfer to the "evidence_sorter_initial" sub-agent.
+"""
+    + decision_criteria()
+    + """
 
 ### IMPORTANT NOTE
 The orchestrator should not modify the input text or perform calculations itself.
@@ -618,7 +600,9 @@ Its sole responsibility is to identify the correct sub-agent based on the Action
 
 If the input lacks an Action keyword or if the provided keyword is invalid,
 respond with:
-"Unable to determine sub-agent. Please include a valid Action keyword (Sort, Sort_Initial, or Wrangle)."
+"Unable to determine sub-agent. Please include a valid Action keyword ("""
+    + valid_actions()
+    + """)."
      """,
     sub_agents=[
         client_communication,
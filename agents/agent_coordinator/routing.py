@@ -0,0 +1,47 @@
+import re
+from typing import Optional
+
+# Action keyword -> sub-agent that handles it. Every backend stage prompt ends
+# with "Action: <keyword>"; the coordinator's decision criteria and the
+# stage_router app are both generated from this table.
+ACTION_ROUTES = {
+    "Sort_Initial": "evidence_sorter_initial",
+    "Wraggler1": "evidence_sorter_1",
+    "Wraggler2": "evidence_sorter_2",
+    "Wraggler3": "evidence_sorter_3",
+    "Email": "client_communication",
+    "Legal": "evidence_sorter_3",
+}
+DEFAULT_ACTION = "Sort_Initial"
+
+_ACTION_LINE = re.compile(r"^\s*Action:\s*(\w+)\s*$", re.MULTILINE)
+
+
+def action_for(text: str) -> Optional[str]:
+    """The last "Action: <keyword>" line of a prompt, if any."""
+    matches = _ACTION_LINE.findall(text or "")
+    return matches[-1] if matches else None
+
+
+def route_for(text: str) -> Optional[str]:
+    """Sub-agent for a prompt's Action keyword; None if it is missing or unknown."""
+    return ACTION_ROUTES.get(action_for(text) or "")
+
+
+def decision_criteria() -> str:
+    """The coordinator's routing rules, one per table entry plus the default."""
+    rules = [
+        f'{number}. If the case includes the keyword "Action: {action}"\n'
+        f'   → Transfer the input (excluding the "Action:" line) to the "{agent}" sub-agent.'
+        for number, (action, agent) in enumerate(ACTION_ROUTES.items(), start=1)
+    ]
+    rules.append(
+        f"{len(rules) + 1}. If no Action keyword is provided, assume the default action is:\n"
+        f'   → "{DEFAULT_ACTION}", and automatically transfer to the '
+        f'"{ACTION_ROUTES[DEFAULT_ACTION]}" sub-agent.'
+    )
+    return "\n\n".join(rules)
+
+
+def valid_actions() -> str:
+    return ", ".join(ACTION_ROUTES)
@@ -0,0 +1,35 @@
+from typing import AsyncGenerator
+
+from google.adk.agents.base_agent import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events.event import Event
+
+from agent_coordinator.agent import agent_coordinator
+from agent_coordinator.routing import route_for
+
+
+class StageRouter(BaseAgent):
+    """
+    Hands a stage prompt straight to the sub-agent named by its "Action:"
+    line, skipping the coordinator's model turn. Prompts without a known
+    action go to the LLM coordinator as before.
+    """
+
+    # Not a sub-agent: an agent can have only one parent, and the coordinator
+    # app already owns this tree
+    coordinator: BaseAgent
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        parts = ctx.user_content.parts if ctx.user_content and ctx.user_content.parts else []
+        prompt = "".join(part.text or "" for part in parts)
+        target = route_for(prompt)
+        agent = self.coordinator.find_sub_agent(target) if target else None
+        async for event in (agent or self.coordinator).run_async(ctx):
+            yield event
+
+
+root_agent = StageRouter(
+    name="stage_router",
+    description="Routes stage prompts to evidence sorters by their Action keyword.",
+    coordinator=agent_coordinator,
+)
@@ -2,18 +2,68 @@ from logging.config import fileConfig
 import requests
 import os
 import json
-import time
 import re
 import io
-import base64
 import glob
-from flask import Flask, request, jsonify
+import hashlib
+import sqlite3
+import tempfile
+import uuid
+from contextlib import ExitStack
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from pypdf import PdfReader
-from typing import Tuple, Optional, List, Dict, Any
+from typing import Tuple, Optional, List, Dict, Any, Callable, Generator, Iterable, Iterator
+import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from flask_cors import CORS
 
-from util import nuke_files, save_files
+from util import detach_files, nuke_files, save_files
+from audio_chunks import (
+    ffmpeg_available,
+    format_timestamp,
+    split_audio,
+    strip_overlap,
+)
+from boilerplate import PAGE_BREAK
+from case_manifest import CaseManifest
+from cases import CaseRegistry, current_case, reset_current_case, set_current_case
+from extraction_cache import ExtractionCache, PartialExtraction
+from streaming_body import (
+    INLINE_DATA_PLACEHOLDER,
+    InlineDataBody,
+    MediaBuffer,
+    open_media,
+)
+from image_prep import prep_stats, prepare_image, record_prepared
+from prompt_packer import pack_prompt, truncate_middle
+from case_digest import reduce_summaries, summarize_document
+from tokens import estimate_tokens
+from retrieval import BM25Index, render_excerpts
+from http_pool import PooledHTTP
+from session_registry import SessionRegistry, session_missing
+from embedded_agents import EmbeddedAgents
+from gemini_client import GeminiClient, response_text
+from rate_limiter import SharedRateLimiter
+from response_cache import ResponseCache, bypass_requested, reset_bypass, set_bypass
+from retry_policy import (
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    RetryPolicy,
+    iterate_in_context,
+    propagate_context,
+    reset_deadline,
+    send_with_retry,
+    start_request_deadline,
+)
+from preflight import PlannerSettings, detect_media_type, plan_file, summarize_plan
+from pdf_tools import (
+    EmbeddedImage,
+    extract_embedded_images,
+    extract_page_texts,
+    split_page,
+)
 
 from dotenv import load_dotenv
 
@@ -22,8 +72,144 @@ from dotenv import load_dotenv
 GEMINI_API_KEY = os.environ.get(
     "GEMINI_API_KEY",
 )
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent"
+GEMINI_MODEL = "gemini-2.5-flash"
+GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
+# Model calls in flight across the whole process; batches overlap up to this many.
+GEMINI_MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", "16"))
+
+# Client-side Gemini quota shared by every thread and worker process on the host
+# through SQLite (0 disables a limit). With adaptive concurrency on, the
+# in-flight limit halves on 429s and grows back by about one per round trip.
+GEMINI_RPM_LIMIT = int(os.environ.get("GEMINI_RPM_LIMIT", "0"))
+GEMINI_TPM_LIMIT = int(os.environ.get("GEMINI_TPM_LIMIT", "0"))
+GEMINI_RATE_LIMIT_DB_PATH = os.environ.get(
+    "GEMINI_RATE_LIMIT_DB_PATH", "./cache/gemini_rate_limit.sqlite3"
+)
+GEMINI_ADAPTIVE_CONCURRENCY = os.environ.get("GEMINI_ADAPTIVE_CONCURRENCY", "1") == "1"
+
+# Cache for deterministic text calls (markdown formatting, pros/cons/percent).
+# Requests with "X-Cache-Bypass: 1" or "Cache-Control: no-cache" force a refresh.
+# RESPONSE_CACHE_DISK_PATH adds a SQLite tier that survives restarts.
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "1") == "1"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "86400"))
+RESPONSE_CACHE_DISK_PATH = os.environ.get("RESPONSE_CACHE_DISK_PATH", "")
+
+# Retry policy shared by Gemini and ADK calls: decorrelated jitter between
+# RETRY_BASE_DELAY_SECONDS and RETRY_MAX_DELAY_SECONDS, Retry-After honored,
+# and no attempt started once less than RETRY_MIN_ATTEMPT_SECONDS of the
+# request deadline is left. REQUEST_DEADLINE_SECONDS bounds each API request
+# (0 disables). A circuit opens after CIRCUIT_FAILURE_THRESHOLD consecutive
+# upstream failures and fails fast for CIRCUIT_RESET_SECONDS.
+RETRY_MAX_ATTEMPTS = int(os.environ.get("RETRY_MAX_ATTEMPTS", "5"))
+RETRY_BASE_DELAY_SECONDS = float(os.environ.get("RETRY_BASE_DELAY_SECONDS", "1"))
+RETRY_MAX_DELAY_SECONDS = float(os.environ.get("RETRY_MAX_DELAY_SECONDS", "30"))
+RETRY_MIN_ATTEMPT_SECONDS = float(os.environ.get("RETRY_MIN_ATTEMPT_SECONDS", "5"))
+REQUEST_DEADLINE_SECONDS = float(os.environ.get("REQUEST_DEADLINE_SECONDS", "900"))
+GEMINI_TIMEOUT_SECONDS = float(os.environ.get("GEMINI_TIMEOUT_SECONDS", "120"))
+ADK_TIMEOUT_SECONDS = float(os.environ.get("ADK_TIMEOUT_SECONDS", "60"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.environ.get("CIRCUIT_RESET_SECONDS", "30"))
+
+gemini = GeminiClient(
+    GEMINI_API_URL,
+    GEMINI_API_KEY,
+    GEMINI_MAX_CONCURRENCY,
+    policy=RetryPolicy(
+        RETRY_MAX_ATTEMPTS,
+        RETRY_BASE_DELAY_SECONDS,
+        RETRY_MAX_DELAY_SECONDS,
+        GEMINI_TIMEOUT_SECONDS,
+        RETRY_MIN_ATTEMPT_SECONDS,
+    ),
+    breaker=CircuitBreaker("Gemini", CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS),
+    rate_limiter=(
+        SharedRateLimiter(
+            GEMINI_RATE_LIMIT_DB_PATH, GEMINI_MODEL, GEMINI_RPM_LIMIT, GEMINI_TPM_LIMIT
+        )
+        if GEMINI_RPM_LIMIT or GEMINI_TPM_LIMIT
+        else None
+    ),
+    adaptive=GEMINI_ADAPTIVE_CONCURRENCY,
+)
+adk_retry_policy = RetryPolicy(
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY_SECONDS,
+    RETRY_MAX_DELAY_SECONDS,
+    ADK_TIMEOUT_SECONDS,
+    RETRY_MIN_ATTEMPT_SECONDS,
+)
+response_cache = (
+    ResponseCache(
+        RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_DISK_PATH
+    )
+    if RESPONSE_CACHE_ENABLED
+    else None
+)
+adk_breaker = CircuitBreaker("ADK server", CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+# Minimum native characters for a PDF page to skip Gemini OCR (checked per page).
 NATIVE_TEXT_THRESHOLD = 50
+# Number of scanned pages of a single PDF sent to Gemini concurrently.
+PDF_OCR_MAX_WORKERS = int(os.environ.get("PDF_OCR_MAX_WORKERS", "4"))
+# Embedded PDF images below either limit are treated as logos/icons and skipped.
+PDF_IMAGE_EXTRACTION_ENABLED = os.environ.get("PDF_IMAGE_EXTRACTION_ENABLED", "1") == "1"
+PDF_IMAGE_MIN_BYTES = int(os.environ.get("PDF_IMAGE_MIN_BYTES", "8192"))
+PDF_IMAGE_MIN_DIMENSION = int(os.environ.get("PDF_IMAGE_MIN_DIMENSION", "128"))
+
+# Number of files ingested concurrently; 1 restores the old sequential behaviour.
+INGEST_MAX_WORKERS = int(os.environ.get("INGEST_MAX_WORKERS", "4"))
+
+# Content-addressed cache of extracted text, shared across stages and cases.
+EXTRACTION_CACHE_ENABLED = os.environ.get("EXTRACTION_CACHE_ENABLED", "1") == "1"
+EXTRACTION_CACHE_PATH = os.environ.get(
+    "EXTRACTION_CACHE_PATH", "./cache/extraction_cache.sqlite3"
+)
+EXTRACTION_CACHE_MAX_BYTES = int(
+    os.environ.get("EXTRACTION_CACHE_MAX_BYTES", str(512 * 1024 * 1024))
+)
+
+# Letterheads, disclaimers, and footers repeated across a case's PDF pages are
+# collapsed to one copy before they reach the stage prompts.
+BOILERPLATE_STRIPPING_ENABLED = os.environ.get("BOILERPLATE_STRIPPING_ENABLED", "1") == "1"
+BOILERPLATE_MIN_LINE_CHARS = int(os.environ.get("BOILERPLATE_MIN_LINE_CHARS", "20"))
+BOILERPLATE_MIN_OCCURRENCES = int(os.environ.get("BOILERPLATE_MIN_OCCURRENCES", "3"))
+
+# Per-stage prompt ceilings in estimated tokens; documents over their share are
+# summarized (PROMPT_SUMMARIZE_OVERFLOW) or else truncated head-and-tail.
+# PROMPT_TOKEN_CEILING_STAGE<N> overrides one stage, 0 disables.
+PROMPT_TOKEN_CEILING = int(os.environ.get("PROMPT_TOKEN_CEILING", "128000"))
+PROMPT_TOKEN_CEILINGS = {
+    stage: int(os.environ.get(f"PROMPT_TOKEN_CEILING_STAGE{stage}", PROMPT_TOKEN_CEILING))
+    for stage in ("1", "2", "3", "4")
+}
+PROMPT_PRIOR_SHARE = float(os.environ.get("PROMPT_PRIOR_SHARE", "0.25"))
+PROMPT_SUMMARIZE_OVERFLOW = os.environ.get("PROMPT_SUMMARIZE_OVERFLOW", "1") == "1"
+
+# Map-reduce digest mode: stages get a Gemini digest of the case instead of the
+# raw documents. "on" always, "auto" once the case context passes the threshold.
+DIGEST_MODE = os.environ.get("DIGEST_MODE", "off").lower()
+DIGEST_THRESHOLD_TOKENS = int(os.environ.get("DIGEST_THRESHOLD_TOKENS", "100000"))
+DIGEST_CHUNK_TOKENS = int(os.environ.get("DIGEST_CHUNK_TOKENS", "8000"))
+DIGEST_MAX_WORKERS = int(os.environ.get("DIGEST_MAX_WORKERS", "4"))
+
+# Local BM25 retrieval: stages 2-4 get only the top-k chunks for their topic
+# instead of every document. The index is built during ingestion, per case.
+RETRIEVAL_ENABLED = os.environ.get("RETRIEVAL_ENABLED", "0") == "1"
+RETRIEVAL_TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", "12"))
+RETRIEVAL_CHUNK_TOKENS = int(os.environ.get("RETRIEVAL_CHUNK_TOKENS", "400"))
+STAGE_RETRIEVAL_QUERIES = {
+    "2": "witness statement interview testimony recorded transcript said saw heard "
+    "driver passenger officer bystander account describe told asked",
+    "3": "medical injury injuries treatment diagnosis hospital doctor physician clinic "
+    "emergency pain x-ray police report citation statute liability fault negligence legal",
+    "4": "estimate repair cost total amount payment invoice damage parts labor "
+    "value settlement deductible loss salvage rental bill charge price",
+}
+
+# Raw media bytes base64-encoded per chunk when streaming a request body to Gemini.
+GEMINI_UPLOAD_CHUNK_BYTES = int(
+    os.environ.get("GEMINI_UPLOAD_CHUNK_BYTES", str(3 * 256 * 1024))
+)
 
 # Agent Development Kit (ADK) Configuration
 API_URL = os.environ.get("ADK_API_URL", "http://127.0.0.1:8000")
@@ -31,19 +217,226 @@ API_URL = os.environ.get("ADK_API_URL", "http://127.0.0.1:8000")
 # CRITICAL FIX: APP_NAME must match the root agent's name defined in agent.py
 # The root agent name is 'agent_coordinator'.
 APP_NAME = "agent_coordinator"
+# ADK app that hands each stage prompt straight to the sub-agent named by its
+# "Action:" line, saving the coordinator's model turn. Runs fall back to
+# APP_NAME if it fails; empty sends stages to the coordinator directly.
+STAGE_ROUTER_APP = os.environ.get("STAGE_ROUTER_APP", "stage_router")
+# "http" reaches the agents through adk api_server at ADK_API_URL; "embedded"
+# runs them in this process with an ADK Runner and in-memory sessions, loading
+# the app packages from ADK_AGENTS_DIR. Embedded sessions do not survive restarts.
+ADK_MODE = os.environ.get("ADK_MODE", "http").lower()
+ADK_AGENTS_DIR = os.environ.get(
+    "ADK_AGENTS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agents"),
+)
+embedded_agents = (
+    EmbeddedAgents(
+        ADK_AGENTS_DIR,
+        [a for a in (STAGE_ROUTER_APP, APP_NAME) if a],
+        timeout_seconds=ADK_TIMEOUT_SECONDS,
+    )
+    if ADK_MODE == "embedded"
+    else None
+)
 
 USER_ID = "progressive_user_1"
+# Session and upload folder of the default case, used by clients without a case ID
 SESSION_ID = "s_progressive_claim_1"
 DATA_FOLDER = "./media"
-
-# Global store for the final string result (stores all step results)
-# The frontend can fetch this after the full pipeline runs.
-pipeline_result_store: List[Dict[str, str]] = []
+# Cases issued by POST /cases get their own upload folder under this root and
+# are dropped after CASE_IDLE_TTL_SECONDS without a request (0 keeps them).
+CASE_UPLOAD_ROOT = os.environ.get("CASE_UPLOAD_ROOT", "./case_media")
+CASE_IDLE_TTL_SECONDS = float(os.environ.get("CASE_IDLE_TTL_SECONDS", "86400"))
+# How long an ADK session is assumed to exist before ensure_session checks it
+# again (0 checks before every run). A run that finds the session gone
+# re-creates it regardless.
+SESSION_REGISTRY_TTL_SECONDS = float(os.environ.get("SESSION_REGISTRY_TTL_SECONDS", "3600"))
+session_registry = SessionRegistry(SESSION_REGISTRY_TTL_SECONDS)
+# Session compaction: every stage run gets a fresh ADK session seeded with the
+# prior stage results as compact state (each result cut to
+# SESSION_STATE_RESULT_TOKENS), instead of one session accumulating every
+# stage's full prompt. The stage session is deleted once the run finishes.
+# Trade-off: a fresh session is never in session_registry, so over HTTP each
+# stage run pays one session-create round trip before /run (one more if the
+# router falls back to the coordinator); the delete runs in the background.
+# That local round trip is small next to re-sending earlier stages' prompts
+# as history. SESSION_COMPACTION=0 keeps one shared session per case, created once.
+SESSION_COMPACTION = os.environ.get("SESSION_COMPACTION", "1") == "1"
+SESSION_STATE_RESULT_TOKENS = int(os.environ.get("SESSION_STATE_RESULT_TOKENS", "1500"))
+
+# Keep-alive connection pool for the ADK server calls. Pool size should
+# cover the peak number of concurrent outbound requests.
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", "10"))
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "32"))
+http_client = PooledHTTP(HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE)
 
 app = Flask(__name__)
 CORS(app)  # gets rid of dumb reasonable security
 
-file_context = ""
+
+def requested_case_id() -> Optional[str]:
+    """Case ID from the X-Case-Id header, a case_id query parameter, or form field."""
+    return (
+        request.headers.get("X-Case-Id")
+        or request.args.get("case_id")
+        or (request.form.get("case_id") if request.method == "POST" else None)
+    )
+
+
+@app.before_request
+def start_request_context():
+    """
+    Gives every API request a time budget that upstream retries respect,
+    records whether it asked to bypass the response cache, and selects the
+    case it works on.
+    """
+    if REQUEST_DEADLINE_SECONDS > 0:
+        g.deadline_token = start_request_deadline(REQUEST_DEADLINE_SECONDS)
+    # Always set, so a bypass never leaks to the next request on a reused thread
+    g.bypass_token = set_bypass(bypass_requested(request.headers))
+
+    case_id = requested_case_id()
+    if case_id and not cases.valid_id(case_id):
+        return jsonify({"error": "Malformed case ID."}), 400
+    case = cases.get(case_id)
+    if case is None:
+        return jsonify({"error": "Unknown case ID. Create a case with POST /cases."}), 404
+    g.case_token = set_current_case(case)
+
+
+@app.teardown_request
+def clear_request_context(exc):
+    token = g.pop("deadline_token", None)
+    if token is not None:
+        try:
+            reset_deadline(token)
+        except ValueError:
+            # Token from another context; start_request_deadline replaces it anyway
+            pass
+    token = g.pop("bypass_token", None)
+    if token is not None:
+        try:
+            reset_bypass(token)
+        except ValueError:
+            pass
+    token = g.pop("case_token", None)
+    if token is not None:
+        try:
+            reset_current_case(token)
+        except ValueError:
+            pass
+
+
+def new_case_manifest() -> CaseManifest:
+    """Documents of one case, so re-uploads in /2-/4 are not re-processed."""
+    return CaseManifest(
+        strip_boilerplate=BOILERPLATE_STRIPPING_ENABLED,
+        min_line_chars=BOILERPLATE_MIN_LINE_CHARS,
+        min_occurrences=BOILERPLATE_MIN_OCCURRENCES,
+        index=BM25Index(RETRIEVAL_CHUNK_TOKENS) if RETRIEVAL_ENABLED else None,
+    )
+
+
+cases = CaseRegistry(
+    CASE_UPLOAD_ROOT,
+    new_case_manifest,
+    default_folder=DATA_FOLDER,
+    default_session_id=SESSION_ID,
+    idle_ttl_seconds=CASE_IDLE_TTL_SECONDS,
+)
+
+extraction_cache = (
+    ExtractionCache(EXTRACTION_CACHE_PATH, EXTRACTION_CACHE_MAX_BYTES)
+    if EXTRACTION_CACHE_ENABLED
+    else None
+)
+
+TRANSCRIBE_SYSTEM_PROMPT = "You are an expert transcriber. Transcribe the audio precisely. Do not add any analysis or introductory remarks. Format the output clearly, including speaker identification if possible."
+
+IMAGE_ANALYSIS_SYSTEM_PROMPT = (
+    "You are an expert document analyst specializing in accident reports. "
+    "Extract all text content from the image (OCR). "
+    "Crucially, provide a detailed, objective description of the visual content, "
+    "such as visible damage, position of vehicles, and environment. "
+    "Combine the extracted text and visual descriptions into a single, cohesive narrative. "
+    "Do not include any introductory or concluding remarks."
+)
+
+DIGEST_CHUNK_PROMPT = (
+    "You are summarizing part of an insurance claim case file for a claims adjuster. "
+    "Keep every fact that matters to liability, damages, injuries, or coverage: names, "
+    "dates, times, locations, vehicle details, amounts, diagnoses, statements, and "
+    "contradictions. Drop boilerplate and formatting. Do not add analysis."
+)
+
+DIGEST_REDUCE_PROMPT = (
+    "You are merging document summaries from one insurance claim into a single case digest. "
+    "Group facts by document, keep names, dates, amounts, and direct statements, "
+    "and point out any contradictions between documents. Do not add analysis."
+)
+
+# Image preprocessing before Gemini upload; tune per deployment to trade
+# upload size against analysis quality.
+IMAGE_PREP_ENABLED = os.environ.get("IMAGE_PREP_ENABLED", "1") == "1"
+IMAGE_MAX_DIMENSION = int(os.environ.get("IMAGE_MAX_DIMENSION", "1600"))
+IMAGE_JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", "85"))
+IMAGE_PNG_TO_JPEG = os.environ.get("IMAGE_PNG_TO_JPEG", "1") == "1"
+IMAGE_PREP_SIGNATURE = (
+    f"prep={IMAGE_PREP_ENABLED},{IMAGE_MAX_DIMENSION},{IMAGE_JPEG_QUALITY},{IMAGE_PNG_TO_JPEG}"
+)
+
+# Long recordings are split into overlapping segments transcribed in parallel.
+AUDIO_CHUNKING_ENABLED = os.environ.get("AUDIO_CHUNKING_ENABLED", "1") == "1"
+AUDIO_SEGMENT_SECONDS = float(os.environ.get("AUDIO_SEGMENT_SECONDS", "300"))
+AUDIO_SEGMENT_OVERLAP_SECONDS = float(os.environ.get("AUDIO_SEGMENT_OVERLAP_SECONDS", "5"))
+AUDIO_TRIM_SILENCE = os.environ.get("AUDIO_TRIM_SILENCE", "1") == "1"
+AUDIO_MAX_WORKERS = int(os.environ.get("AUDIO_MAX_WORKERS", "4"))
+# Upper bound for each ffprobe/ffmpeg run while splitting a recording; the
+# request deadline caps it further. 0 leaves only the deadline.
+AUDIO_FFMPEG_TIMEOUT_SECONDS = float(os.environ.get("AUDIO_FFMPEG_TIMEOUT_SECONDS", "120"))
+AUDIO_CHUNK_SIGNATURE = (
+    f"chunks={AUDIO_CHUNKING_ENABLED},{AUDIO_SEGMENT_SECONDS},"
+    f"{AUDIO_SEGMENT_OVERLAP_SECONDS},{AUDIO_TRIM_SILENCE}"
+)
+
+# Preflight (dry-run) estimates and optional admission limits for /1.
+# A limit of 0 disables it.
+PREFLIGHT_SECONDS_PER_CALL = float(os.environ.get("PREFLIGHT_SECONDS_PER_CALL", "8"))
+PREFLIGHT_OUTPUT_TOKENS_PER_CALL = int(
+    os.environ.get("PREFLIGHT_OUTPUT_TOKENS_PER_CALL", "500")
+)
+GEMINI_INPUT_USD_PER_MTOK = float(os.environ.get("GEMINI_INPUT_USD_PER_MTOK", "0.30"))
+GEMINI_AUDIO_INPUT_USD_PER_MTOK = float(
+    os.environ.get("GEMINI_AUDIO_INPUT_USD_PER_MTOK", "1.00")
+)
+GEMINI_OUTPUT_USD_PER_MTOK = float(os.environ.get("GEMINI_OUTPUT_USD_PER_MTOK", "2.50"))
+PREFLIGHT_WARN_PAGES = int(os.environ.get("PREFLIGHT_WARN_PAGES", "100"))
+PREFLIGHT_MAX_PAGES = int(os.environ.get("PREFLIGHT_MAX_PAGES", "0"))
+PREFLIGHT_MAX_GEMINI_CALLS = int(os.environ.get("PREFLIGHT_MAX_GEMINI_CALLS", "0"))
+
+# Bump when the PDF extraction strategy changes so stale cache entries are ignored.
+PDF_EXTRACTOR_VERSION = "pdf-v5"
+
+PREFLIGHT_SETTINGS = PlannerSettings(
+    native_text_threshold=NATIVE_TEXT_THRESHOLD,
+    image_extraction=PDF_IMAGE_EXTRACTION_ENABLED,
+    image_min_bytes=PDF_IMAGE_MIN_BYTES,
+    image_min_dimension=PDF_IMAGE_MIN_DIMENSION,
+    image_max_dimension=IMAGE_MAX_DIMENSION if IMAGE_PREP_ENABLED else 0,
+    audio_chunking=AUDIO_CHUNKING_ENABLED,
+    segment_seconds=AUDIO_SEGMENT_SECONDS,
+    overlap_seconds=AUDIO_SEGMENT_OVERLAP_SECONDS,
+    concurrency=INGEST_MAX_WORKERS * max(PDF_OCR_MAX_WORKERS, AUDIO_MAX_WORKERS),
+    seconds_per_call=PREFLIGHT_SECONDS_PER_CALL,
+    output_tokens_per_call=PREFLIGHT_OUTPUT_TOKENS_PER_CALL,
+    input_usd_per_mtok=GEMINI_INPUT_USD_PER_MTOK,
+    audio_input_usd_per_mtok=GEMINI_AUDIO_INPUT_USD_PER_MTOK,
+    output_usd_per_mtok=GEMINI_OUTPUT_USD_PER_MTOK,
+    warn_pages=PREFLIGHT_WARN_PAGES,
+    max_pages=PREFLIGHT_MAX_PAGES,
+    max_calls=PREFLIGHT_MAX_GEMINI_CALLS,
+)
+
 
 # --- Utility Functions (Keep as-is for robust file processing) ---
 
@@ -95,90 +488,58 @@ def delimit_output_string(output_text: str) -> str:
     return output_text
 
 
-def call_gemini_api(payload, max_retries=5):
-    """Handles API request and implements exponential backoff."""
-    for attempt in range(max_retries):
-        try:
-            headers = {"Content-Type": "application/json"}
-            response = requests.post(
-                f"{GEMINI_API_URL}?key={GEMINI_API_KEY}",
-                headers=headers,
-                data=json.dumps(payload),
-                timeout=120,
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            if response.status_code in [429, 500, 503] and attempt < max_retries - 1:
-                wait_time = 2**attempt
-                time.sleep(wait_time)
-            else:
-                raise e
-    return None
-
+def call_gemini_api(payload, max_retries=RETRY_MAX_ATTEMPTS):
+    """
+    Blocking generateContent call through the shared async client, which
+    retries throttling and server errors under the shared retry policy.
+    The payload may be an InlineDataBody, which is streamed instead of serialized.
+    """
+    return gemini.generate_sync(payload, max_retries)
 
-def call_simple_gemini_api(payload, max_retries=5):
-    """Handles API request and implements exponential backoff."""
-    for attempt in range(max_retries):
-        try:
-            headers = {"Content-Type": "application/json"}
-            response = requests.post(
-                f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={GEMINI_API_KEY}",
-                headers=headers,
-                data=json.dumps(payload),
-                timeout=120,
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            if response.status_code in [429, 500, 503] and attempt < max_retries - 1:
-                wait_time = 2**attempt
-                time.sleep(wait_time)
-            else:
-                raise e
 
-    return None
+def call_simple_gemini_api(payload, max_retries=RETRY_MAX_ATTEMPTS):
+    """Kept for existing callers; same client and model as call_gemini_api."""
+    return call_gemini_api(payload, max_retries)
 
 
 def call_gemini(payload):
-    gemini_response = call_simple_gemini_api(payload)
-    generated_text = (
-        gemini_response.get("candidates", [{}])[0]
-        .get("content", {})
-        .get("parts", [{}])[0]
-        .get("text", "")
+    """Text-only generation, served from the response cache when possible."""
+    if response_cache is None:
+        return response_text(call_simple_gemini_api(payload))
+    return response_cache.get_or_call(
+        GEMINI_MODEL, payload, lambda: response_text(call_simple_gemini_api(payload))
     )
 
-    return generated_text
-
 
-def transcribe_audio_bytes(file_bytes: bytes) -> str:
-    """Uses Gemini to transcribe an M4A audio file."""
+def transcription_body(file_bytes: MediaBuffer) -> InlineDataBody:
+    """Gemini request transcribing an M4A audio file (or one segment of it)."""
     if not GEMINI_API_KEY:
         raise ValueError("Gemini API Key is not configured.")
 
-    encoded_audio = base64.b64encode(file_bytes).decode("utf-8")
-    system_prompt = "You are an expert transcriber. Transcribe the audio precisely. Do not add any analysis or introductory remarks. Format the output clearly, including speaker identification if possible."
+    system_prompt = TRANSCRIBE_SYSTEM_PROMPT
 
     payload = {
         "systemInstruction": {"parts": [{"text": system_prompt}]},
         "contents": [
             {
                 "parts": [
-                    {"inlineData": {"mimeType": "audio/m4a", "data": encoded_audio}},
+                    {
+                        "inlineData": {
+                            "mimeType": "audio/m4a",
+                            "data": INLINE_DATA_PLACEHOLDER,
+                        }
+                    },
                     {"text": "Transcribe the audio provided."},
                 ]
             }
         ],
     }
+    return InlineDataBody(payload, file_bytes, GEMINI_UPLOAD_CHUNK_BYTES)
 
-    gemini_response = call_gemini_api(payload)
-    generated_text = (
-        gemini_response.get("candidates", [{}])[0]
-        .get("content", {})
-        .get("parts", [{}])[0]
-        .get("text", "")
-    )
+
+def transcribe_audio_segment(file_bytes: MediaBuffer) -> str:
+    """Uses Gemini to transcribe an M4A audio file (or one segment of it)."""
+    generated_text = response_text(call_gemini_api(transcription_body(file_bytes)))
 
     if not generated_text:
         raise Exception("Gemini returned an empty transcription response.")
@@ -186,28 +547,110 @@ def transcribe_audio_bytes(file_bytes: bytes) -> str:
     return generated_text
 
 
-def analyze_image_bytes(file_bytes: bytes, mime_type: str) -> str:
-    """Uses Gemini to analyze image bytes (PNG/JPG) for text and description."""
+def transcribe_audio_bytes(file_bytes: MediaBuffer) -> str:
+    """
+    Transcribes an M4A recording. Long recordings are trimmed of leading and
+    trailing silence, split into overlapping segments, transcribed concurrently,
+    and stitched back together with segment timestamps. A segment that fails
+    is marked in the transcript instead of discarding the whole file, and the
+    transcript is then not cached.
+    """
+    if not AUDIO_CHUNKING_ENABLED or not ffmpeg_available():
+        return transcribe_audio_segment(file_bytes)
+
+    with tempfile.TemporaryDirectory(prefix="audio_") as workdir:
+        try:
+            segments = split_audio(
+                file_bytes,
+                workdir,
+                segment_seconds=AUDIO_SEGMENT_SECONDS,
+                overlap_seconds=AUDIO_SEGMENT_OVERLAP_SECONDS,
+                trim_silence=AUDIO_TRIM_SILENCE,
+                timeout=AUDIO_FFMPEG_TIMEOUT_SECONDS or None,
+            )
+        except subprocess.SubprocessError as e:
+            # A hung or failing ffmpeg: send the recording whole, as without ffmpeg
+            app.logger.warning(f"Audio splitting failed, transcribing unsplit: {e}")
+            return transcribe_audio_segment(file_bytes)
+
+        if len(segments) == 1:
+            with open_media(segments[0].path) as segment_bytes:
+                return transcribe_audio_segment(segment_bytes)
+
+        print(f"-> Transcribing {len(segments)} audio segments")
+
+        # Transient failures are already retried per request by the Gemini
+        # client's RetryPolicy; a segment that still fails is marked as such
+        with ExitStack() as stack:
+            bodies = [
+                transcription_body(stack.enter_context(open_media(segment.path)))
+                for segment in segments
+            ]
+            results = gemini.batch(bodies, limit=AUDIO_MAX_WORKERS, return_exceptions=True)
+
+        transcripts: List[Optional[str]] = []
+        for segment, result in zip(segments, results):
+            text = "" if isinstance(result, BaseException) else response_text(result)
+            if not text:
+                error = result if isinstance(result, BaseException) else "empty response"
+                app.logger.warning(f"Audio segment {segment.index} failed: {error}")
+            transcripts.append(text or None)
+
+    if all(text is None for text in transcripts):
+        raise Exception("Gemini failed to transcribe every audio segment.")
+
+    stitched = []
+    previous_text = ""
+    for segment, text in zip(segments, transcripts):
+        label = f"[{format_timestamp(segment.start)} - {format_timestamp(segment.end)}]"
+        if text is None:
+            stitched.append(f"{label}\n[Segment could not be transcribed]")
+            previous_text = ""
+            continue
+        if previous_text:
+            text = strip_overlap(previous_text, text)
+        stitched.append(f"{label}\n{text}")
+        previous_text = text
+
+    transcript = "\n\n".join(stitched)
+    if None in transcripts:
+        return PartialExtraction(transcript)
+    return transcript
+
+
+def image_analysis_body(file_bytes: MediaBuffer, mime_type: str) -> InlineDataBody:
+    """Gemini request analyzing image bytes (PNG/JPG) or a PDF for text and description."""
     if not GEMINI_API_KEY:
         raise ValueError("Gemini API Key is not configured for image analysis.")
 
-    encoded_image = base64.b64encode(file_bytes).decode("utf-8")
+    if IMAGE_PREP_ENABLED and mime_type.startswith("image/"):
+        prepared = prepare_image(
+            file_bytes,
+            mime_type,
+            max_dimension=IMAGE_MAX_DIMENSION,
+            jpeg_quality=IMAGE_JPEG_QUALITY,
+            png_to_jpeg=IMAGE_PNG_TO_JPEG,
+        )
+        record_prepared(prepared)
+        print(
+            f"-> Image prep: {prepared.original_bytes} -> {prepared.prepared_bytes} bytes "
+            f"(saved {prepared.bytes_saved})"
+        )
+        file_bytes, mime_type = prepared.data, prepared.mime_type
 
-    system_prompt = (
-        "You are an expert document analyst specializing in accident reports. "
-        "Extract all text content from the image (OCR). "
-        "Crucially, provide a detailed, objective description of the visual content, "
-        "such as visible damage, position of vehicles, and environment. "
-        "Combine the extracted text and visual descriptions into a single, cohesive narrative. "
-        "Do not include any introductory or concluding remarks."
-    )
+    system_prompt = IMAGE_ANALYSIS_SYSTEM_PROMPT
 
     payload = {
         "systemInstruction": {"parts": [{"text": system_prompt}]},
         "contents": [
             {
                 "parts": [
-                    {"inlineData": {"mimeType": mime_type, "data": encoded_image}},
+                    {
+                        "inlineData": {
+                            "mimeType": mime_type,
+                            "data": INLINE_DATA_PLACEHOLDER,
+                        }
+                    },
                     {
                         "text": "Analyze the image and provide the combined narrative as requested."
                     },
@@ -216,13 +659,11 @@ def analyze_image_bytes(file_bytes: bytes, mime_type: str) -> str:
         ],
     }
 
-    gemini_response = call_gemini_api(payload)
-    generated_text = (
-        gemini_response.get("candidates", [{}])[0]
-        .get("content", {})
-        .get("parts", [{}])[0]
-        .get("text", "")
-    )
+    return InlineDataBody(payload, file_bytes, GEMINI_UPLOAD_CHUNK_BYTES)
+
+
+def image_analysis_text(gemini_response: Dict[str, Any]) -> str:
+    generated_text = response_text(gemini_response)
 
     if not generated_text:
         raise Exception("Gemini returned an empty text response during image analysis.")
@@ -230,36 +671,111 @@ def analyze_image_bytes(file_bytes: bytes, mime_type: str) -> str:
     return generated_text
 
 
-def parse_pdf_bytes(file_bytes: bytes) -> str:
-    """Core logic to parse PDF bytes, falling back to Gemini for OCR and embedded images."""
-    native_text = ""
+def analyze_image_bytes(file_bytes: MediaBuffer, mime_type: str) -> str:
+    """Uses Gemini to analyze image bytes (PNG/JPG) for text and description."""
+    return image_analysis_text(call_gemini_api(image_analysis_body(file_bytes, mime_type)))
+
 
+def parse_pdf_bytes(file_bytes: MediaBuffer) -> str:
+    """
+    Core logic to parse PDF bytes page by page. Pages with a usable text layer
+    are kept as-is; only scanned pages are split out and sent to Gemini for OCR
+    (concurrently), and the results are merged back in page order. Embedded
+    photos on text pages are extracted and analyzed alongside the native text.
+    A page or photo Gemini fails on is marked in place, and the text is then
+    not cached. Page segments are joined with PAGE_BREAK, and the ones Gemini
+    wrote are labelled, so boilerplate stripping only touches text-layer pages.
+    """
     # 1. Attempt Native Text Extraction
     try:
         pdf_reader = PdfReader(io.BytesIO(file_bytes))
-        for page in pdf_reader.pages:
-            native_text += page.extract_text() or ""
-        native_text = " ".join(native_text.split())
+        page_texts = extract_page_texts(pdf_reader)
     except Exception as e:
         app.logger.warning(f"pypdf native extraction failed: {e}")
-        pass
+        # Unreadable container: let Gemini handle the whole file as before
+        return "[Scanned document]\n" + analyze_image_bytes(file_bytes, "application/pdf")
+    if not page_texts:
+        # No pages pypdf can walk: same whole-file fallback
+        return "[Scanned document]\n" + analyze_image_bytes(file_bytes, "application/pdf")
+
+    # 2. Per-page Hybrid Check
+    scanned_pages = [
+        index
+        for index, text in enumerate(page_texts)
+        if len(text) <= NATIVE_TEXT_THRESHOLD
+    ]
+
+    # 3. Embedded photos on text pages (scanned pages are covered by the OCR call)
+    embedded_images: List[EmbeddedImage] = []
+    if PDF_IMAGE_EXTRACTION_ENABLED:
+        embedded_images = extract_embedded_images(
+            pdf_reader,
+            skip_pages=scanned_pages,
+            min_bytes=PDF_IMAGE_MIN_BYTES,
+            min_dimension=PDF_IMAGE_MIN_DIMENSION,
+        )
 
-    # 2. Hybrid Check and Fallback to Gemini
-    if len(native_text) > NATIVE_TEXT_THRESHOLD:
-        return native_text
-    else:
+    if not scanned_pages and not embedded_images:
+        return PAGE_BREAK.join(page_texts)
+
+    if scanned_pages:
+        print(f"-> OCR fallback for {len(scanned_pages)}/{len(page_texts)} PDF pages")
+    if embedded_images:
+        print(f"-> Analyzing {len(embedded_images)} embedded PDF images")
+
+    # 4. Fallback to Gemini for scanned pages and embedded photos only.
+    # Each task is (page index, label, request); labels mark Gemini's text.
+    tasks: List[Tuple[int, str, InlineDataBody]] = []
+    for page_index in scanned_pages:
+        if len(page_texts) == 1:
+            page_bytes = file_bytes
+        else:
+            page_bytes = split_page(pdf_reader, page_index)
         # Use the same image analysis prompt as it covers both OCR and visual description
-        # We assume the PDF MIME type is handled by the model when passed as inlineData
-        return analyze_image_bytes(file_bytes, "application/pdf")
+        label = f"[Scanned page {page_index + 1}]\n"
+        tasks.append((page_index, label, image_analysis_body(page_bytes, "application/pdf")))
+    for image in embedded_images:
+        label = f"[Embedded image {image.name} (page {image.page_index + 1})]\n"
+        tasks.append((image.page_index, label, image_analysis_body(image.data, image.mime_type)))
+
+    page_sections: List[List[str]] = [[text] for text in page_texts]
+    for page_index in scanned_pages:
+        page_sections[page_index] = []
+
+    responses = gemini.batch(
+        [body for _, _, body in tasks], limit=PDF_OCR_MAX_WORKERS, return_exceptions=True
+    )
+    failed = 0
+    for (page_index, label, _), result in zip(tasks, responses):
+        try:
+            if isinstance(result, BaseException):
+                raise result
+            page_sections[page_index].append(label + image_analysis_text(result))
+        except Exception as e:
+            # One failed page or photo must not cost the rest of the document
+            failed += 1
+            app.logger.warning(f"{label.strip()} could not be analyzed: {e}")
+            if page_index in scanned_pages:
+                page_sections[page_index].append(f"{label}[Page could not be read]")
+            else:
+                page_sections[page_index].append(f"{label}[Image could not be analyzed]")
 
+    if failed == len(tasks) and len(scanned_pages) == len(page_texts):
+        raise Exception("Gemini failed to read every page of the PDF.")
 
-def prettify_output(string: str) -> str:
+    text = PAGE_BREAK.join(
+        section for sections in page_sections for section in sections if section
+    )
+    return PartialExtraction(text) if failed else text
+
+
+def prettify_payload(string: str) -> Dict[str, Any]:
     if not GEMINI_API_KEY:
         raise ValueError("Gemini API Key is not configured.")
 
     system_prompt = "You are an expert plain text to markdown converter. Convert and format the plain text as markdown for user convenience and readability. DO NOT CHANCE TEXT CONTENT and DO NOT MAKE COMMENTS, do your job and keep quiet."
 
-    payload = {
+    return {
         "systemInstruction": {"parts": [{"text": system_prompt}]},
         "contents": [
             {
@@ -270,13 +786,9 @@ def prettify_output(string: str) -> str:
         ],
     }
 
-    gemini_response = call_simple_gemini_api(payload)
-    generated_text = (
-        gemini_response.get("candidates", [{}])[0]
-        .get("content", {})
-        .get("parts", [{}])[0]
-        .get("text", "")
-    )
+
+def prettify_output(string: str) -> str:
+    generated_text = call_gemini(prettify_payload(string))
 
     if not generated_text:
         raise Exception("Gemini returned an empty transcription response.")
@@ -284,34 +796,156 @@ def prettify_output(string: str) -> str:
     return generated_text
 
 
+def stream_prettify_output(string: str) -> Iterator[str]:
+    """prettify_output() as markdown deltas from streamGenerateContent."""
+    payload = prettify_payload(string)
+    if response_cache is not None:
+        cached = response_cache.lookup(GEMINI_MODEL, payload)
+        if cached is not None:
+            yield cached
+            return
+
+    parts = []
+    for delta in gemini.stream_sync(payload):
+        parts.append(delta)
+        yield delta
+
+    generated_text = "".join(parts)
+    if not generated_text:
+        raise Exception("Gemini returned an empty transcription response.")
+    if response_cache is not None:
+        response_cache.store(GEMINI_MODEL, payload, generated_text)
+
+
+CASE_ASSESSMENT_PROMPT = (
+    "You will be given information on a plaintiff law case: a summary of the case with a "
+    "recommended action. Assess it from a law firm's perspective. In pros, explain your "
+    "reasoning on why the case SHOULD be taken on. In cons, explain your reasoning on why "
+    "the case should NOT be taken on. In percent, rate the value of the case to the firm "
+    "from 0 to 100, and in rationale explain why you chose that value."
+)
+
+CASE_ASSESSMENT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "pros": {"type": "STRING"},
+        "cons": {"type": "STRING"},
+        "percent": {"type": "INTEGER"},
+        "rationale": {"type": "STRING"},
+    },
+    "required": ["pros", "cons", "percent", "rationale"],
+    "propertyOrdering": ["pros", "cons", "percent", "rationale"],
+}
+
+# Prompts for the per-field fallback when the structured response cannot be parsed
+CASE_ASSESSMENT_FALLBACK_PROMPTS = {
+    "pros": "You will be given information on a plaintiff law case. You will be given  an summary of the case with a recommended action. Upon reading the information decide and explain your reasoning on why the case SHOULD be taken on",
+    "cons": "You will be given information on a plaintiff law case. You will be given  an summary of the case with a recommended action. Upon reading the information decide and explain your reasoning on why the case should NOT be taken on",
+    "percent": "You will be given information on a plaintiff law case. You will be given  an summary of the case with a recommended action. Upon reading the information decide on a percentage value from 0-100% to determine the value of the case from a law firm perspective. On the line immediately following write an explanation as to why you decided to rate the case that percentage value",
+}
+
+
+def assess_case(final_output: str) -> Dict[str, str]:
+    """
+    Pros, cons, and a value percentage for the final synthesis in one
+    structured Gemini call. percent is "NN%" followed by the rationale on the
+    next line, the format the report view splits. If the JSON cannot be used,
+    the three original prompts run concurrently instead.
+    """
+    payload = {
+        "systemInstruction": {"parts": [{"text": CASE_ASSESSMENT_PROMPT}]},
+        "contents": [{"parts": [{"text": final_output}]}],
+        "generationConfig": {
+            "responseMimeType": "application/json",
+            "responseSchema": CASE_ASSESSMENT_SCHEMA,
+        },
+    }
+    # Cached only once it parses, so a malformed response is not replayed
+    cached = response_cache.lookup(GEMINI_MODEL, payload) if response_cache is not None else None
+    text = cached if cached is not None else response_text(call_simple_gemini_api(payload))
+    try:
+        assessment = json.loads(text)
+        percent = max(0, min(100, int(assessment["percent"])))
+        # The report view shows only the first line after the percentage
+        rationale = " ".join(str(assessment["rationale"]).split())
+        result = {
+            "pros": str(assessment["pros"]),
+            "cons": str(assessment["cons"]),
+            "percent": f"{percent}%\n{rationale}",
+            "rationale": rationale,
+        }
+        if cached is None and response_cache is not None:
+            response_cache.store(GEMINI_MODEL, payload, text)
+        return result
+    except (ValueError, KeyError, TypeError) as e:
+        app.logger.warning(f"Structured case assessment failed, falling back: {e}")
+
+    fields = list(CASE_ASSESSMENT_FALLBACK_PROMPTS)
+    payloads = [
+        {
+            "systemInstruction": {"parts": [{"text": CASE_ASSESSMENT_FALLBACK_PROMPTS[field]}]},
+            "contents": [{"parts": [{"text": final_output}]}],
+        }
+        for field in fields
+    ]
+    with ThreadPoolExecutor(max_workers=len(fields)) as executor:
+        texts = list(executor.map(propagate_context(call_gemini), payloads))
+    assessment = dict(zip(fields, texts))
+    assessment["rationale"] = assessment["percent"].partition("\n")[2].strip()
+    return assessment
+
+
 # --- ADK Agent Logic ---
 
 
-def ensure_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID):
+def ensure_session(
+    app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID, state: Optional[Dict[str, Any]] = None
+):
     """Create session if it doesn't exist, preventing termination issues."""
-    session_payload = {"state": {}}
-    resp = requests.post(
-        f"{API_URL}/apps/{app_name}/users/{user_id}/sessions/{session_id}",
-        json=session_payload,
+    key = (app_name, user_id, session_id)
+    if session_registry.is_known(key):
+        return
+
+    session_payload = {"state": state or {}}
+    # Creating a session is idempotent (409 if it exists), so timeouts are retried too
+    resp = send_with_retry(
+        lambda timeout: http_client.post(
+            f"{API_URL}/apps/{app_name}/users/{user_id}/sessions/{session_id}",
+            json=session_payload,
+            timeout=timeout,
+        ),
+        adk_retry_policy,
+        adk_breaker,
+        retry_exceptions=(requests.exceptions.ConnectionError, requests.exceptions.Timeout),
     )
     if resp.status_code in (200, 201):
         app.logger.info("ADK Session ready.")
+        session_registry.mark(key)
     elif resp.status_code == 409:
         app.logger.info("ADK Session already exists.")
+        session_registry.mark(key)
     else:
         # If the session cannot be created or accessed, raise a critical error
         raise Exception(f"Failed to ensure ADK session: {resp.status_code} {resp.text}")
 
 
 def callAgent(
-    prompt: str, app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
+    prompt: str,
+    app_name=APP_NAME,
+    user_id=USER_ID,
+    session_id=SESSION_ID,
+    state: Optional[Dict[str, Any]] = None,
 ) -> Tuple[str, Optional[int]]:
     """
     Send prompt to ADK agent and return final string and HTTP status code.
     Allows for non-200 responses to be handled gracefully without crashing the pipeline.
+    state seeds the session if it has to be created.
     """
+    if embedded_agents is not None:
+        return embedded_agents.call(prompt, app_name, user_id, session_id, state)
+
     try:
-        ensure_session(app_name, user_id, session_id)
+        ensure_session(app_name, user_id, session_id, state)
     except Exception as e:
         # Return a critical error if session setup fails (likely ADK server is down)
         return (
@@ -319,23 +953,13 @@ def callAgent(
             503,
         )
 
-    payload = {
-        # The ADK API requires the app_name (which is the root agent name)
-        # to be repeated here in the body payload for consistency.
-        "app_name": app_name,
-        "user_id": user_id,
-        "session_id": session_id,
-        "new_message": {"role": "user", "parts": [{"text": prompt}]},
-    }
+    payload = agent_run_payload(prompt, app_name, user_id, session_id)
 
     # Explicitly set content-type for robustness
     headers = {"Content-Type": "application/json"}
 
     try:
-        # Add a timeout to prevent indefinite hanging
-        response = requests.post(
-            f"{API_URL}/run", json=payload, headers=headers, timeout=60
-        )
+        response = post_agent_run("/run", payload, headers, state=state)
 
         if response.status_code == 200:
             data = response.json()
@@ -354,24 +978,275 @@ def callAgent(
                 response.status_code,
             )
 
-    except requests.exceptions.ConnectionError:
+    except Exception as e:
+        return agent_failure(e)
+
+
+def agent_run_payload(
+    prompt: str, app_name: str, user_id: str, session_id: str, streaming: bool = False
+) -> Dict[str, Any]:
+    payload = {
+        # The ADK API requires the app_name (which is the root agent name)
+        # to be repeated here in the body payload for consistency.
+        "app_name": app_name,
+        "user_id": user_id,
+        "session_id": session_id,
+        "new_message": {"role": "user", "parts": [{"text": prompt}]},
+    }
+    if streaming:
+        payload["streaming"] = True
+    return payload
+
+
+def post_agent_run(
+    path: str,
+    payload: Dict[str, Any],
+    headers: Dict[str, str],
+    stream: bool = False,
+    state: Optional[Dict[str, Any]] = None,
+) -> requests.Response:
+    """
+    POSTs a run to the ADK server. If the server no longer has the session
+    (e.g. it restarted), the session is re-created and the run sent once more.
+    """
+
+    def send() -> requests.Response:
+        # A run is not idempotent: only retry when it cannot have reached the agent
+        return send_with_retry(
+            lambda timeout: http_client.post(
+                f"{API_URL}{path}",
+                json=payload,
+                headers=headers,
+                timeout=timeout,
+                stream=stream,
+            ),
+            adk_retry_policy,
+            adk_breaker,
+            retry_statuses=(429, 502, 503),
+        )
+
+    response = send()
+    if session_missing(response):
+        response.close()
+        app.logger.info("ADK session not found; re-creating it.")
+        key = (payload["app_name"], payload["user_id"], payload["session_id"])
+        session_registry.forget(key)
+        ensure_session(*key, state=state)
+        response = send()
+    return response
+
+
+def agent_failure(e: Exception) -> Tuple[str, int]:
+    """Maps an exception from an ADK run request to an error message and status."""
+    if isinstance(e, CircuitOpenError):
+        return (f"AGENT CRITICAL ERROR: {e} Retry shortly.", 503)
+    if isinstance(e, DeadlineExceeded):
+        return (f"AGENT CRITICAL ERROR: Request deadline exceeded. {e}", 504)
+    if isinstance(e, requests.exceptions.ConnectionError):
         # Specific error if the ADK server is not reachable
         return (
             f"AGENT CRITICAL ERROR: Failed to connect to ADK Server at {API_URL}. Is the ADK server running?",
             503,
         )
-    except requests.exceptions.Timeout:
+    if isinstance(e, requests.exceptions.Timeout):
         # Specific error if the request times out
         return (
-            "AGENT CRITICAL ERROR: ADK Request timed out (over 60 seconds). Agent may be stuck.",
+            f"AGENT CRITICAL ERROR: ADK Request timed out (over {ADK_TIMEOUT_SECONDS:g} seconds). Agent may be stuck.",
             504,
         )
+    # Any other unexpected request-related error
+    return (
+        f"AGENT CRITICAL ERROR: An unexpected error occurred during ADK request: {e}",
+        500,
+    )
+
+
+def stream_agent(
+    prompt: str,
+    app_name=APP_NAME,
+    user_id=USER_ID,
+    session_id=SESSION_ID,
+    state: Optional[Dict[str, Any]] = None,
+) -> Generator[str, None, Tuple[str, int]]:
+    """
+    callAgent() over ADK's /run_sse: yields text deltas as the agent produces
+    them and returns (final text, status) like callAgent. The final text is
+    the last complete event with text, as with /run.
+    """
+    if embedded_agents is not None:
+        return (
+            yield from embedded_agents.stream(prompt, app_name, user_id, session_id, state=state)
+        )
+
+    try:
+        ensure_session(app_name, user_id, session_id, state)
     except Exception as e:
-        # Catch any other unexpected request-related error
         return (
-            f"AGENT CRITICAL ERROR: An unexpected error occurred during ADK request: {e}",
-            500,
+            f"AGENT CRITICAL ERROR: Could not establish session. ADK Server at {API_URL} may be offline. Detail: {e}",
+            503,
+        )
+
+    payload = agent_run_payload(prompt, app_name, user_id, session_id, streaming=True)
+    headers = {"Content-Type": "application/json", "Accept": "text/event-stream"}
+
+    try:
+        response = post_agent_run("/run_sse", payload, headers, stream=True, state=state)
+    except Exception as e:
+        return agent_failure(e)
+
+    with response:
+        if response.status_code != 200:
+            return (
+                f"Error {response.status_code}: {response.text}",
+                response.status_code,
+            )
+
+        response.encoding = "utf-8"
+        final_text = None
+        partial_text = []
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                event = json.loads(line[5:])
+                if event.get("error"):
+                    return (f"Error 500: {event['error']}", 500)
+                texts = [
+                    part["text"]
+                    for part in event.get("content", {}).get("parts", [])
+                    if "text" in part
+                ]
+                if not texts:
+                    continue
+                text = "".join(texts)
+                if event.get("partial"):
+                    partial_text.append(text)
+                    yield text
+                else:
+                    # A complete event repeats the partials before it; forward it
+                    # only when the agent did not stream them
+                    if not partial_text:
+                        yield text
+                    final_text = text
+                    partial_text = []
+        except Exception as e:
+            return agent_failure(e)
+
+    if final_text is None:
+        final_text = "".join(partial_text)
+    final_text = final_text.strip()
+    return (final_text or "No text found in agent response.", 200)
+
+
+def stage_agent_apps() -> List[str]:
+    return [STAGE_ROUTER_APP, APP_NAME] if STAGE_ROUTER_APP else [APP_NAME]
+
+
+def fall_back_from(app_name: str, status: int) -> bool:
+    """Whether a failed run on the router should be retried on the coordinator."""
+    # A deadline or timeout leaves no budget for a second run
+    if status in (200, 504) or app_name == APP_NAME:
+        return False
+    app.logger.warning(f"ADK app {app_name} failed with {status}; falling back to {APP_NAME}.")
+    return True
+
+
+def call_stage_agent(
+    prompt: str, session_id: str, state: Optional[Dict[str, Any]] = None
+) -> Tuple[str, int]:
+    """callAgent() through the stage router, falling back to the coordinator."""
+    for app_name in stage_agent_apps():
+        text, status = callAgent(
+            prompt, app_name=app_name, user_id=USER_ID, session_id=session_id, state=state
         )
+        if not fall_back_from(app_name, status):
+            break
+    return text, status
+
+
+def stream_stage_agent(
+    prompt: str, session_id: str, state: Optional[Dict[str, Any]] = None
+) -> Generator[str, None, Tuple[str, int]]:
+    """stream_agent() through the stage router, falling back to the coordinator."""
+    for app_name in stage_agent_apps():
+        text, status = yield from stream_agent(
+            prompt, app_name=app_name, user_id=USER_ID, session_id=session_id, state=state
+        )
+        if not fall_back_from(app_name, status):
+            break
+    return text, status
+
+
+def stage_session(case, stage: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    ADK session ID and initial state for one stage run. With compaction the
+    session is new, so the model's history holds only this stage's prompt;
+    earlier stages reach it as the prior summary in the prompt and as compact
+    state. Without it, every stage shares the case's session. A fresh session
+    costs a create call per run (see SESSION_COMPACTION).
+    """
+    if not SESSION_COMPACTION:
+        return case.session_id, None
+    state = {
+        "case_id": case.case_id,
+        "stage": stage,
+        "prior_results": [
+            {
+                "step": result["step"],
+                "status": result["status"],
+                "good": result.get("good"),
+                "summary": truncate_middle(result["result"], SESSION_STATE_RESULT_TOKENS),
+            }
+            for result in case.results
+        ],
+    }
+    return f"{case.session_id}_stage{stage}_{uuid.uuid4().hex[:8]}", state
+
+
+def delete_stage_session(session_id: str):
+    """Drops a finished stage session from the ADK server (best effort)."""
+    for app_name in stage_agent_apps():
+        key = (app_name, USER_ID, session_id)
+        try:
+            if embedded_agents is not None:
+                embedded_agents.delete_session(*key)
+            elif session_registry.is_known(key):
+                http_client.delete(
+                    f"{API_URL}/apps/{app_name}/users/{USER_ID}/sessions/{session_id}",
+                    timeout=10,
+                )
+        except Exception as e:
+            app.logger.warning(f"Could not delete ADK session {session_id}: {e}")
+        session_registry.forget(key)
+
+
+session_cleanup = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-cleanup")
+
+
+def prepare_stage_run(case, stage: str) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+    """Builds a stage's prompt and session, recording the prompt's size on the case."""
+    prompt = stage_prompt(stage)
+    session_id, state = stage_session(case, stage)
+    case.prompt_tokens[stage] = estimate_tokens(prompt)
+    app.logger.info(
+        f"Stage {stage} prompt: ~{case.prompt_tokens[stage]} tokens, "
+        f"{'fresh' if SESSION_COMPACTION else 'shared'} session history"
+    )
+    return prompt, session_id, state
+
+
+def finish_stage_run(case, session_id: str):
+    if session_id != case.session_id:
+        session_cleanup.submit(delete_stage_session, session_id)
+
+
+def run_stage_agent(case, stage: str) -> Tuple[str, int]:
+    """Runs a stage's prompt through the stage agent in the stage's session."""
+    prompt, session_id, state = prepare_stage_run(case, stage)
+    try:
+        return call_stage_agent(prompt, session_id, state)
+    finally:
+        finish_stage_run(case, session_id)
 
 
 def find_data_sufficiency(text):
@@ -398,99 +1273,394 @@ def find_data_sufficiency(text):
 # --- Batch Processing and Pipeline Orchestration ---
 
 
-def process_files_in_folder(folder_path: str) -> str:
-    """Loads and parses all PDF, M4A, and image files in a folder."""
-    combined_content = []
+def cached_extract(
+    file_bytes: MediaBuffer, extractor: str, prompt: str, compute: Callable[[], str]
+) -> str:
+    """Consults the extraction cache before running an extractor."""
+    if extraction_cache is None:
+        return compute()
 
-    if not os.path.isdir(folder_path):
-        app.logger.error(f"Data folder not found at: {folder_path}. Cannot load files.")
-        return "ERROR: Data folder not found."
+    key = extraction_cache.make_key(file_bytes, extractor, prompt, GEMINI_MODEL)
+    try:
+        cached = extraction_cache.get(key, extractor)
+    except sqlite3.Error as e:
+        # A broken cache must never block ingestion
+        app.logger.warning(f"Extraction cache lookup failed: {e}")
+        cached = None
+    if cached is not None:
+        return cached
+
+    content = compute()
+    if isinstance(content, PartialExtraction):
+        app.logger.warning(f"Not caching partial {extractor} extraction")
+        return content
+    try:
+        extraction_cache.put(key, extractor, content)
+    except sqlite3.Error as e:
+        app.logger.warning(f"Extraction cache store failed: {e}")
+    return content
 
-    # Use glob to find all files in the directory
-    file_paths = glob.glob(os.path.join(folder_path, "*"))
 
-    if not file_paths:
-        app.logger.warning("No files found in the data folder.")
-        return "WARNING: No PDF or M4A files found in the folder."
+def detect_file_type(file_name: str, file_bytes: MediaBuffer) -> Tuple[str, Optional[str]]:
+    """Sniffs the file type from magic bytes, falling back to the file extension."""
+    return detect_media_type(file_name, bytes(file_bytes[:1024]))
 
-    files_processed_count = 0
 
-    for file_path in file_paths:
-        file_name = os.path.basename(file_path)
-        file_extension = file_name.lower().split(".")[-1]
+def extraction_settings(kind: str, mime_type: Optional[str]) -> Tuple[str, str]:
+    """Extractor name and prompt signature that make up the extraction cache key."""
+    if kind == "pdf":
+        return (
+            PDF_EXTRACTOR_VERSION,
+            f"{IMAGE_ANALYSIS_SYSTEM_PROMPT}|threshold={NATIVE_TEXT_THRESHOLD}"
+            f"|images={PDF_IMAGE_EXTRACTION_ENABLED},{PDF_IMAGE_MIN_BYTES},{PDF_IMAGE_MIN_DIMENSION}"
+            f"|{IMAGE_PREP_SIGNATURE}",
+        )
+    if kind == "audio":
+        return "audio/m4a", f"{TRANSCRIBE_SYSTEM_PROMPT}|{AUDIO_CHUNK_SIGNATURE}"
+    return mime_type or "", f"{IMAGE_ANALYSIS_SYSTEM_PROMPT}|{IMAGE_PREP_SIGNATURE}"
 
-        try:
-            with open(file_path, "rb") as f:
-                file_bytes = f.read()
 
-            if file_extension == "pdf":
+def process_single_file(file_path: str) -> Tuple[Optional[str], bool]:
+    """
+    Parses one PDF, M4A, or image file into its output section.
+    Returns the section text (None if skipped) and whether the file was processed.
+    """
+    file_name = os.path.basename(file_path)
+
+    try:
+        # Memory-map instead of reading: uploads are streamed to Gemini chunk by chunk
+        with open_media(file_path) as file_bytes:
+            kind, mime_type = detect_file_type(file_name, file_bytes)
+            extractor, prompt = extraction_settings(kind, mime_type)
+
+            if kind == "pdf":
                 print(f"-> Processing PDF file: {file_name}")
-                content = parse_pdf_bytes(file_bytes)
-                combined_content.append(
-                    f"--- DOCUMENT ANALYSIS (PDF: {file_name}) ---\n{content}"
+                content = cached_extract(
+                    file_bytes, extractor, prompt, lambda: parse_pdf_bytes(file_bytes)
                 )
-                files_processed_count += 1
+                return f"--- DOCUMENT ANALYSIS (PDF: {file_name}) ---\n{content}", True
 
-            elif file_extension == "m4a":
+            elif kind == "audio":
                 print(f"-> Transcribing M4A file: {file_name}")
-                content = transcribe_audio_bytes(file_bytes)
-                combined_content.append(
-                    f"--- TRANSCRIPT (M4A: {file_name}) ---\n{content}"
+                content = cached_extract(
+                    file_bytes,
+                    extractor,
+                    prompt,
+                    lambda: transcribe_audio_bytes(file_bytes),
                 )
-                files_processed_count += 1
+                return f"--- TRANSCRIPT (M4A: {file_name}) ---\n{content}", True
 
-            elif file_extension in ["png", "jpg", "jpeg"]:
-                mime_type = f"image/{file_extension}"
+            elif kind == "image":
                 print(f"-> Analyzing Image file: {file_name}")
-                content = analyze_image_bytes(file_bytes, mime_type)
-                combined_content.append(
-                    f"--- IMAGE ANALYSIS ({file_name}) ---\n{content}"
+                content = cached_extract(
+                    file_bytes,
+                    extractor,
+                    prompt,
+                    lambda: analyze_image_bytes(file_bytes, mime_type),
                 )
-                files_processed_count += 1
+                return f"--- IMAGE ANALYSIS ({file_name}) ---\n{content}", True
 
             else:
                 print(f"-> Skipping unsupported file type: {file_name}")
+                return None, False
 
-        except Exception as e:
-            app.logger.error(f"Failed to process file {file_name}: {e}")
-            combined_content.append(f"--- ERROR PROCESSING {file_name} --- Error: {e}")
-
-    if files_processed_count == 0:
-        return "WARNING: No supported files (PDF, M4A, PNG, JPG) were processed."
-
-    return "\n\n".join(combined_content)
+    except Exception as e:
+        app.logger.error(f"Failed to process file {file_name}: {e}")
+        return f"--- ERROR PROCESSING {file_name} --- Error: {e}", False
 
 
-def run_claim_pipeline() -> List[Dict[str, str]]:
+def plan_ingestion(folder_path: str) -> Dict[str, Any]:
     """
-    Executes the multi-step claims processing pipeline.
+    Dry run of process_files_in_folder: inspects every file without calling any
+    model and estimates Gemini calls, upload bytes, tokens, cost, and latency.
     """
-    global pipeline_result_store
-    pipeline_result_store = []
-
-    # 1. Load and process all client data from the local folder
-    app.logger.info("--- STEP 0: Data Ingestion and Pre-processing ---")
-    initial_data = process_files_in_folder(DATA_FOLDER)
-
-    if "ERROR:" in initial_data or "WARNING:" in initial_data:
-        pipeline_result_store.append(
-            {"step": "0. Ingestion", "status": "ERROR", "result": initial_data}
+    file_plans = []
+    for file_path in sorted(glob.glob(os.path.join(folder_path, "*"))):
+        file_name = os.path.basename(file_path)
+        with open_media(file_path) as file_bytes:
+            kind, mime_type = detect_file_type(file_name, file_bytes)
+            cached = False
+            if extraction_cache is not None and kind != "unsupported":
+                extractor, prompt = extraction_settings(kind, mime_type)
+                key = extraction_cache.make_key(file_bytes, extractor, prompt, GEMINI_MODEL)
+                try:
+                    cached = extraction_cache.contains(key)
+                except sqlite3.Error:
+                    cached = False
+            file_plans.append(plan_file(file_name, file_bytes, PREFLIGHT_SETTINGS, cached))
+
+    return summarize_plan(file_plans, PREFLIGHT_SETTINGS)
+
+
+def render_case_context() -> str:
+    """Renders the case manifest into prompt text and logs boilerplate savings."""
+    manifest = current_case().manifest
+    context = manifest.render()
+    stats = manifest.normalization_stats
+    if stats.get("lines_removed"):
+        app.logger.info(
+            f"Boilerplate stripping saved {stats['chars_saved']} chars "
+            f"(~{stats['tokens_saved']} tokens) across {stats['lines_removed']} lines"
         )
-        return pipeline_result_store
-
-    # 2. STEP 1: Initial Case Acceptance/Rejection
-    app.logger.info(
-        "--- STEP 1: Initial Case Acceptance/Rejection (evidence_sorter_initial) ---"
-    )
+    return context
 
-    # The prompt must tell the coordinator which sub-agent to use
-    step1_prompt = (
-        f"Case Data for Initial Review:\n\n{initial_data}\n\nAction: Sort_Initial"
-    )
 
-    step1_result, status = callAgent(
-        step1_prompt, app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
+def call_gemini_text(system_prompt: str, text: str) -> str:
+    payload = {
+        "systemInstruction": {"parts": [{"text": system_prompt}]},
+        "contents": [{"parts": [{"text": text}]}],
+    }
+    generated_text = call_gemini(payload)
+    if not generated_text:
+        # Raising keeps empty results out of the cache
+        raise ValueError("Gemini returned no text.")
+    return generated_text
+
+
+def map_summary(section: str, chunk_pool: ThreadPoolExecutor) -> str:
+    """The digest map step for one document section, cached by its text."""
+    summarize_chunk = propagate_context(
+        lambda chunk: call_gemini_text(DIGEST_CHUNK_PROMPT, chunk)
+    )
+    return cached_extract(
+        section.encode("utf-8"),
+        "digest-map",
+        f"{DIGEST_CHUNK_PROMPT}\0chunk={DIGEST_CHUNK_TOKENS}",
+        lambda: summarize_document(section, DIGEST_CHUNK_TOKENS, summarize_chunk, chunk_pool),
+    )
+
+
+def build_case_digest() -> str:
+    """
+    Map-reduce summary of the case: each document is chunked and summarized
+    in parallel (cached per document hash), then the summaries are merged
+    into one digest. Reuses the last digest while the document set is unchanged.
+    """
+    case = current_case()
+    case_manifest = case.manifest
+    documents = case_manifest.documents()
+    document_set = tuple(d["sha256"] for d in documents)
+    if case_manifest.case_digest and case_manifest.case_digest[0] == document_set:
+        return case_manifest.case_digest[1]
+
+    with ThreadPoolExecutor(max_workers=DIGEST_MAX_WORKERS) as chunk_pool:
+
+        @propagate_context
+        def map_document(document: Dict[str, Any]) -> str:
+            if document["summary"] is not None:
+                return document["summary"]
+            summary = map_summary(document["section"], chunk_pool)
+            case_manifest.set_summary(document["sha256"], summary)
+            return summary
+
+        # Document threads only wait on chunk_pool, which bounds the Gemini calls
+        with ThreadPoolExecutor(max_workers=max(1, len(documents))) as document_pool:
+            summaries = [
+                f"--- {d['kind'].upper()}: {d['file']} ---\n{summary}"
+                for d, summary in zip(documents, document_pool.map(map_document, documents))
+            ]
+
+        joined = "\n\n".join(summaries)
+        digest = cached_extract(
+            joined.encode("utf-8"),
+            "digest-reduce",
+            f"{DIGEST_REDUCE_PROMPT}\0chunk={DIGEST_CHUNK_TOKENS}",
+            lambda: reduce_summaries(
+                summaries,
+                DIGEST_CHUNK_TOKENS,
+                lambda batch: call_gemini_text(DIGEST_REDUCE_PROMPT, batch),
+                chunk_pool,
+            ),
+        )
+
+    app.logger.info(
+        f"Case digest: {len(documents)} documents, ~{estimate_tokens(case.file_context)} "
+        f"tokens of context reduced to ~{estimate_tokens(digest)}"
+    )
+    case_manifest.case_digest = (document_set, digest)
+    return digest
+
+
+def use_case_digest() -> bool:
+    case = current_case()
+    if DIGEST_MODE == "on":
+        return len(case.manifest) > 0
+    if DIGEST_MODE == "auto":
+        return estimate_tokens(case.file_context) > DIGEST_THRESHOLD_TOKENS
+    return False
+
+
+def summarize_section(text: str, budget: int) -> Optional[str]:
+    """
+    Summarizer for case documents over their prompt budget: the digest map
+    summary, shared with digest mode through the extraction cache. None lets
+    the packer truncate instead.
+    """
+    try:
+        with ThreadPoolExecutor(max_workers=DIGEST_MAX_WORKERS) as chunk_pool:
+            summary = map_summary(text, chunk_pool)
+    except Exception as e:
+        app.logger.warning(f"Section summary failed, truncating instead: {e}")
+        return None
+    # Keep the section's "--- KIND (file) ---" header so the agent can cite it
+    header = text.split("\n", 1)[0]
+    return f"{header}\n{summary}"
+
+
+def pack_stage_data(stage: str, prior: str, template: str) -> Tuple[str, str]:
+    """
+    Fits the prior summary and the case data under the stage's token ceiling.
+    The case data is the digest in digest mode, the stage's retrieved excerpts
+    with retrieval on, and otherwise every document. template is the prompt
+    without them, counted as overhead. Returns (prior, case data).
+    """
+    case_manifest = current_case().manifest
+    documents = None
+    if use_case_digest():
+        try:
+            documents = [f"--- CASE DIGEST ---\n{build_case_digest()}"]
+        except Exception as e:
+            app.logger.warning(f"Case digest failed, using raw documents: {e}")
+    elif case_manifest.index is not None and stage in STAGE_RETRIEVAL_QUERIES:
+        results = case_manifest.index.search(STAGE_RETRIEVAL_QUERIES[stage], RETRIEVAL_TOP_K)
+        if results:
+            documents = render_excerpts(results, [d["sha256"] for d in case_manifest.documents()])
+            app.logger.info(
+                f"Stage {stage} retrieval: {len(results)} of {len(case_manifest.index)} chunks"
+            )
+    if documents is None:
+        documents = case_manifest.render_sections()
+    packed = pack_prompt(
+        prior,
+        documents,
+        PROMPT_TOKEN_CEILINGS[stage],
+        overhead=template,
+        prior_share=PROMPT_PRIOR_SHARE,
+        summarize=summarize_section if PROMPT_SUMMARIZE_OVERFLOW else None,
+    )
+    for entry in packed.report:
+        app.logger.info(
+            f"Stage {stage} prompt: {entry['action']} {entry['section']} "
+            f"({entry['tokens']} -> {entry['budget']} tokens)"
+        )
+    app.logger.info(f"Stage {stage} prompt: ~{packed.tokens} tokens of case data")
+    return packed.prior, "\n\n".join(packed.documents)
+
+
+def fingerprint_file(file_path: str) -> Tuple[str, str]:
+    """Returns the SHA-256 of a file's bytes and its sniffed kind."""
+    with open_media(file_path) as file_bytes:
+        kind, _ = detect_file_type(os.path.basename(file_path), file_bytes)
+        return hashlib.sha256(file_bytes).hexdigest(), kind
+
+
+def process_files_in_folder(
+    folder_path: str,
+    max_workers: Optional[int] = None,
+    manifest: Optional[CaseManifest] = None,
+    stage: str = "",
+) -> str:
+    """
+    Loads and parses all PDF, M4A, and image files in a folder.
+    Files are handled concurrently by a bounded worker pool (INGEST_MAX_WORKERS);
+    sections are emitted in the same order as the sequential run.
+
+    With a case manifest, files whose bytes are already part of the case (or
+    repeat earlier in the same upload) are not re-processed: they are recorded
+    as references and only newly extracted sections are returned.
+    """
+    combined_content = []
+
+    if not os.path.isdir(folder_path):
+        app.logger.error(f"Data folder not found at: {folder_path}. Cannot load files.")
+        return "ERROR: Data folder not found."
+
+    # Use glob to find all files in the directory
+    file_paths = glob.glob(os.path.join(folder_path, "*"))
+
+    if not file_paths:
+        app.logger.warning("No files found in the data folder.")
+        return "WARNING: No PDF or M4A files found in the folder."
+
+    fingerprints: List[Tuple[str, str]] = []
+    pending_paths = file_paths
+    if manifest is not None:
+        fingerprints = [fingerprint_file(file_path) for file_path in file_paths]
+        first_seen: Dict[str, int] = {}
+        for index, (digest, _) in enumerate(fingerprints):
+            if digest not in manifest:
+                first_seen.setdefault(digest, index)
+        pending_paths = [file_paths[index] for index in sorted(first_seen.values())]
+
+    workers = INGEST_MAX_WORKERS if max_workers is None else max_workers
+    workers = max(1, min(workers, len(pending_paths) or 1))
+
+    if workers == 1:
+        results = [process_single_file(file_path) for file_path in pending_paths]
+    else:
+        # executor.map yields results in submission order, keeping sections stable
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="ingest"
+        ) as executor:
+            results = list(executor.map(propagate_context(process_single_file), pending_paths))
+
+    files_processed_count = 0
+
+    if manifest is None:
+        for section, processed in results:
+            if section is not None:
+                combined_content.append(section)
+            if processed:
+                files_processed_count += 1
+    else:
+        results_by_path = dict(zip(pending_paths, results))
+        for file_path, (digest, kind) in zip(file_paths, fingerprints):
+            file_name = os.path.basename(file_path)
+            if file_path not in results_by_path:
+                # Already part of the case: resolve to the stored document
+                if manifest.add_reference(digest, file_name, stage):
+                    print(f"-> Skipping re-upload of known document: {file_name}")
+                    files_processed_count += 1
+                continue
+
+            section, processed = results_by_path[file_path]
+            if section is None:
+                continue
+            if processed:
+                manifest.add(digest, file_name, kind, section, stage)
+                files_processed_count += 1
+            combined_content.append(section)
+
+    if files_processed_count == 0:
+        return "WARNING: No supported files (PDF, M4A, PNG, JPG) were processed."
+
+    return "\n\n".join(combined_content)
+
+
+def run_claim_pipeline() -> List[Dict[str, str]]:
+    """
+    Executes the multi-step claims processing pipeline. Each step builds its
+    prompt and session the way /1../4 do.
+    """
+    case = current_case()
+    case.reset()
+    pipeline_result_store = case.results
+
+    # 1. Load and process all client data from the local folder
+    app.logger.info("--- STEP 0: Data Ingestion and Pre-processing ---")
+    initial_data = process_files_in_folder(
+        case.upload_dir, manifest=case.manifest, stage="1"
     )
+    case.file_context = render_case_context()
+
+    if "ERROR:" in initial_data or "WARNING:" in initial_data:
+        pipeline_result_store.append(
+            {"step": "0. Ingestion", "status": "ERROR", "result": initial_data}
+        )
+        return pipeline_result_store
+
+    # 2. STEP 1: Initial Case Acceptance/Rejection
+    step1_result, status = run_stage_agent(case, "1")
 
     if status != 200:
         pipeline_result_store.append(
@@ -525,21 +1695,8 @@ def run_claim_pipeline() -> List[Dict[str, str]]:
         }
     )
 
-    # The pipeline continues if accepted and sufficient data is present
-    previous_step_summary = final_output
-
     # 3. STEP 2: Detailed Evidence Sorting - Phase 1 (Witness/Interviews)
-    app.logger.info(
-        "--- STEP 2: Detailed Evidence Sorting - Phase 1 (evidence_sorter_1) ---"
-    )
-
-    # Pass the initial data along with the output from the previous step
-    step2_input = f"Initial Summary:\n{previous_step_summary}\n\nNew/Combined Data:\n{initial_data}"
-    step2_prompt = f"{step2_input}\n\nAction: Wraggler1"
-
-    step2_result, status = callAgent(
-        step2_prompt, app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
-    )
+    step2_result, status = run_stage_agent(case, "2")
 
     if status != 200:
         pipeline_result_store.append(
@@ -555,19 +1712,9 @@ def run_claim_pipeline() -> List[Dict[str, str]]:
     pipeline_result_store.append(
         {"step": "2. Evidence Sort 1", "status": "COMPLETE", "result": final_output}
     )
-    previous_step_summary = final_output
 
     # 4. STEP 3: Detailed Evidence Sorting - Phase 2 (Medical/Legal Verification)
-    app.logger.info(
-        "--- STEP 3: Detailed Evidence Sorting - Phase 2 (evidence_sorter_2) ---"
-    )
-
-    step3_input = f"Previous Sort 1 Result:\n{previous_step_summary}\n\nCombined Raw Data:\n{initial_data}"
-    step3_prompt = f"{step3_input}\n\nAction: Wraggler2"
-
-    step3_result, status = callAgent(
-        step3_prompt, app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
-    )
+    step3_result, status = run_stage_agent(case, "3")
 
     if status != 200:
         pipeline_result_store.append(
@@ -583,17 +1730,9 @@ def run_claim_pipeline() -> List[Dict[str, str]]:
     pipeline_result_store.append(
         {"step": "3. Evidence Sort 2", "status": "COMPLETE", "result": final_output}
     )
-    previous_step_summary = final_output
 
     # 5. STEP 4: Final Evidence Synthesis
-    app.logger.info("--- STEP 4: Final Evidence Synthesis (evidence_sorter_3) ---")
-
-    step4_input = f"Results from Sort 2 Verification:\n{previous_step_summary}\n\nOriginal Raw Data:\n{initial_data}"
-    step4_prompt = f"{step4_input}\n\nAction: Wraggler3"
-
-    step4_result, status = callAgent(
-        step4_prompt, app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
-    )
+    step4_result, status = run_stage_agent(case, "4")
 
     if status != 200:
         pipeline_result_store.append(
@@ -635,11 +1774,87 @@ def run_pipeline_endpoint():
 
 @app.route("/pipeline_results", methods=["GET"])
 def get_pipeline_results():
-    """Endpoint to retrieve the last pipeline run's results."""
+    """Endpoint to retrieve the case's pipeline results."""
     # This route is intended for a frontend to poll or fetch the final state.
-    if not pipeline_result_store:
+    results = current_case().results
+    if not results:
         return jsonify({"message": "Pipeline has not been run yet."}), 200
-    return jsonify(pipeline_result_store), 200
+    return jsonify(results), 200
+
+
+@app.post("/cases")
+def create_case() -> Tuple[Any, int]:
+    """Issues a new case ID; send it as X-Case-Id (or case_id) on the stage requests."""
+    case = cases.create()
+    return jsonify(case.summary()), 201
+
+
+@app.get("/cases/<case_id>")
+def get_case(case_id: str) -> Tuple[Any, int]:
+    case = cases.get(case_id)
+    if case is None:
+        return jsonify({"error": "Unknown case ID."}), 404
+    return jsonify(dict(case.summary(), results=case.results)), 200
+
+
+@app.delete("/cases/<case_id>")
+def delete_case(case_id: str) -> Tuple[Any, int]:
+    """Drops a case and its uploads."""
+    if not cases.delete(case_id):
+        return jsonify({"error": "Unknown case ID."}), 404
+    return jsonify({"deleted": case_id}), 200
+
+
+@app.post("/preflight")
+def preflight() -> Tuple[Any, int]:
+    """
+    Dry-run endpoint: inspects the uploaded files without calling any model and
+    returns page/image/audio counts plus estimated Gemini calls, bytes, tokens,
+    cost, and latency. Does not touch the current case's uploads.
+    """
+    uploaded_files = request.files.getlist("files[]")
+    with tempfile.TemporaryDirectory(prefix="preflight_") as folder:
+        save_files(uploaded_files, folder)
+        plan = plan_ingestion(folder)
+    return jsonify(plan), 200
+
+
+@app.route("/case_manifest", methods=["GET"])
+def get_case_manifest():
+    """Endpoint listing the current case's documents, their stage, and re-uploads."""
+    case_manifest = current_case().manifest
+    return (
+        jsonify(
+            {
+                "documents": case_manifest.summary(),
+                "normalization": case_manifest.normalization_stats,
+            }
+        ),
+        200,
+    )
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Endpoint exposing cache and preprocessing statistics for the ingestion layer."""
+    metrics: Dict[str, Any] = {}
+    if extraction_cache is not None:
+        metrics["extraction_cache"] = extraction_cache.stats()
+    metrics["image_prep"] = prep_stats()
+    metrics["gemini"] = gemini.stats()
+    if response_cache is not None:
+        metrics["response_cache"] = response_cache.stats()
+    # Gemini's connection reuse is under "gemini"; this pool serves ADK only
+    metrics["adk_http_pool"] = http_client.stats()
+    metrics["adk_breaker"] = adk_breaker.stats()
+    metrics["adk_sessions"] = session_registry.stats()
+    if embedded_agents is not None:
+        metrics["adk_embedded"] = embedded_agents.stats()
+    metrics["cases"] = cases.stats()
+    index = current_case().manifest.index
+    if index is not None:
+        metrics["retrieval_index"] = index.stats()
+    return jsonify(metrics), 200
 
 
 @app.route("/health", methods=["GET"])
@@ -654,24 +1869,56 @@ def sanity() -> str:
     return "sus"
 
 
-@app.post("/1")
-def run_1() -> List[Dict[str, str]]:
+STAGE_STEPS = {
+    "1": "1. Initial Review",
+    "2": "2. Evidence Sort 1",
+    "3": "3. Evidence Sort 2",
+    "4": "4. Final Synthesis",
+}
+
+
+def ingest_stage(stage: str, uploaded_files) -> Optional[Dict[str, Any]]:
     """
-    Executes the multi-step claims processing pipeline.
+    Saves and processes a stage's uploads into the case manifest. Stage 1
+    starts the case over. Returns the stored record if ingestion stops the
+    pipeline, else None.
     """
-    global pipeline_result_store
-    global file_context
-    file_context = 0
-    nuke_files()
-    pipeline_result_store = []
+    case = current_case()
+    pipeline_result_store = case.results
+
+    if stage == "1":
+        case.reset()
+
+    nuke_files(case.upload_dir)
+    save_files(uploaded_files, case.upload_dir)
+
+    if stage != "1":
+        # Re-uploaded documents resolve to the manifest and appear once in the prompt
+        process_files_in_folder(case.upload_dir, manifest=case.manifest, stage=stage)
+        case.file_context = render_case_context()
+        return None
 
     # 1. Load and process all client data from the local folder
     app.logger.info("--- STEP 0: Data Ingestion and Pre-processing ---")
-    uploaded_files = request.files.getlist("files[]")
-    save_files(uploaded_files)
 
-    initial_data = process_files_in_folder(DATA_FOLDER)
-    file_context = initial_data
+    if PREFLIGHT_MAX_PAGES or PREFLIGHT_MAX_GEMINI_CALLS:
+        plan = plan_ingestion(case.upload_dir)
+        if not plan["admitted"]:
+            pipeline_result_store.append(
+                {
+                    "step": "0. Ingestion",
+                    "status": "REJECTED",
+                    "result": "Upload rejected by preflight: "
+                    + " ".join(plan["warnings"]),
+                    "good": False,
+                }
+            )
+            return pipeline_result_store[-1]
+
+    initial_data = process_files_in_folder(
+        case.upload_dir, manifest=case.manifest, stage="1"
+    )
+    case.file_context = render_case_context()
 
     if "ERROR:" in initial_data or "WARNING:" in initial_data:
         pipeline_result_store.append(
@@ -683,329 +1930,239 @@ def run_1() -> List[Dict[str, str]]:
             }
         )
         return pipeline_result_store[-1]
+    return None
 
-    # 2. STEP 1: Initial Case Acceptance/Rejection
-    app.logger.info(
-        "--- STEP 1: Initial Case Acceptance/Rejection (evidence_sorter_initial) ---"
-    )
-
-    # The prompt must tell the coordinator which sub-agent to use
-    step1_prompt = (
-        f"Case Data for Initial Review:\n\n{initial_data}\n\nAction: Sort_Initial"
-    )
-
-    step1_result, status = callAgent(
-        step1_prompt, app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
-    )
-
-    step1_result = prettify_output(step1_result)
 
-    if status != 200:
-        pipeline_result_store.append(
-            {
-                "step": "1. Initial Review",
-                "status": "ADK ERROR",
-                "result": step1_result,
-                "good": False,
-            }
+def stage_prompt(stage: str) -> str:
+    """Builds the coordinator prompt for a stage from the prior results and case data."""
+    pipeline_result_store = current_case().results
+    if stage == "1":
+        # 2. STEP 1: Initial Case Acceptance/Rejection
+        app.logger.info(
+            "--- STEP 1: Initial Case Acceptance/Rejection (evidence_sorter_initial) ---"
         )
-        return pipeline_result_store
-
-    # Check the result of the initial sort for case status
-    recommendation = find_data_sufficiency(step1_result)
-
-    if recommendation in ["REJECT CASE", "INSUFFICIENT DATA"]:
-        status_label = (
-            "REJECTED" if recommendation == "REJECT CASE" else "INSUFFICIENT DATA"
+        # The prompt must tell the coordinator which sub-agent to use
+        template = "Case Data for Initial Review:\n\n{data}\n\nAction: Sort_Initial"
+        _, case_data = pack_stage_data("1", "", template)
+        return template.format(data=case_data)
+
+    if stage == "2":
+        # 3. STEP 2: Detailed Evidence Sorting - Phase 1 (Witness/Interviews)
+        app.logger.info(
+            "--- STEP 2: Detailed Evidence Sorting - Phase 1 (evidence_sorter_1) ---"
         )
-        final_output = step1_result
-        pipeline_result_store.append(
-            {
-                "step": "1. Initial Review",
-                "status": status_label,
-                "result": final_output,
-                "good": False,
-            }
+        # Pass the initial data along with the output from the previous step
+        template = "Initial Summary:\n{prior}\n\nNew/Combined Data:\n{data}\n\nAction: Wraggler1"
+        previous_step_summary = pipeline_result_store[-1]["result"]
+    elif stage == "3":
+        # 4. STEP 3: Detailed Evidence Sorting - Phase 2 (Medical/Legal Verification)
+        app.logger.info(
+            "--- STEP 3: Detailed Evidence Sorting - Phase 2 (evidence_sorter_2) ---"
         )
-        app.logger.info(f"Pipeline stopped: {status_label}")
-        return pipeline_result_store[-1]
-
-    final_output = step1_result
-    pipeline_result_store.append(
-        {
-            "step": "1. Initial Review",
-            "status": "ACCEPTED/SUFFICIENT",
-            "result": final_output,
-            "good": True,
-        }
-    )
-
-    return pipeline_result_store[-1]
-
-
-@app.post("/2")
-def run_2() -> List[Dict[str, str]]:
-    global pipeline_result_store
-    global file_context
+        template = "Previous Sort 1 Result:\n{prior}\n\nCombined Raw Data:\n{data}\n\nAction: Wraggler2"
+        previous_step_summary = pipeline_result_store[-1]["result"]
+    else:
+        # 5. STEP 4: Final Evidence Synthesis
+        app.logger.info("--- STEP 4: Final Evidence Synthesis (evidence_sorter_3) ---")
+        template = "Results from Sort 3 Verification:\n{prior}\n\nOriginal Raw Data:\n{data}\n\nAction: Wraggler3"
+        previous_step_summary = ""
+        for step in pipeline_result_store:
+            previous_step_summary += step["step"] + " -> " + step["result"] + "\n\n"
 
-    uploaded_files = request.files.getlist("files[]")
-    nuke_files()
-    save_files(uploaded_files)
+    prior, case_data = pack_stage_data(stage, previous_step_summary, template)
+    return template.format(prior=prior, data=case_data)
 
-    file_context += process_files_in_folder(DATA_FOLDER)
-    initial_data = file_context
 
-    final_output = pipeline_result_store[-1]["result"]
+def blocking_prettify(text: str) -> List[str]:
+    return [prettify_output(text)]
 
-    # The pipeline continues if accepted and sufficient data is present
-    previous_step_summary = final_output
 
-    step2_input = f"Initial Summary:\n{previous_step_summary}\n\nNew/Combined Data:\n{initial_data}"
+def formatted(text: str, prettify: Callable[[str], Iterable[str]]) -> Generator[str, None, str]:
+    """Runs a prettifier, yielding its deltas and returning the whole markdown."""
+    parts = []
+    for delta in prettify(text):
+        parts.append(delta)
+        yield delta
+    return "".join(parts)
 
-    # 3. STEP 2: Detailed Evidence Sorting - Phase 1 (Witness/Interviews)
-    app.logger.info(
-        "--- STEP 2: Detailed Evidence Sorting - Phase 1 (evidence_sorter_1) ---"
-    )
 
-    # Pass the initial data along with the output from the previous step
-    step2_input = f"Initial Summary:\n{previous_step_summary}\n\nNew/Combined Data:\n{initial_data}"
-    step2_prompt = f"{step2_input}\n\nAction: Wraggler1"
+def complete_stage(
+    stage: str,
+    agent_text: str,
+    status: int,
+    prettify: Callable[[str], Iterable[str]] = blocking_prettify,
+) -> Generator[str, None, Dict[str, Any]]:
+    """
+    Post-processes a stage's agent output and stores the stage record.
+    Yields the markdown formatting deltas (one per formatting call with the
+    blocking prettifier) and returns the stored record.
+    """
+    step = STAGE_STEPS[stage]
+    pipeline_result_store = current_case().results
 
-    step2_result, status = callAgent(
-        step2_prompt, app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
-    )
+    if stage == "1":
+        agent_text = yield from formatted(agent_text, prettify)
 
     if status != 200:
+        if stage in ("3", "4"):
+            agent_text = yield from formatted(agent_text, prettify)
         pipeline_result_store.append(
-            {
-                "step": "2. Evidence Sort 1",
-                "status": "ADK ERROR",
-                "result": step2_result,
-                "good": False,
-            }
+            {"step": step, "status": "ADK ERROR", "result": agent_text, "good": False}
         )
         return pipeline_result_store[-1]
 
-    recommendation = find_data_sufficiency(step2_result)
+    if stage != "4":
+        # Check the result of the sort for case status
+        recommendation = find_data_sufficiency(agent_text)
 
-    if recommendation in ["REJECT CASE", "INSUFFICIENT DATA"]:
-        status_label = (
-            "REJECTED" if recommendation == "REJECT CASE" else "INSUFFICIENT DATA"
+        if recommendation in ["REJECT CASE", "INSUFFICIENT DATA"]:
+            status_label = (
+                "REJECTED" if recommendation == "REJECT CASE" else "INSUFFICIENT DATA"
+            )
+            if stage != "1":
+                agent_text = yield from formatted(agent_text, prettify)
+            pipeline_result_store.append(
+                {"step": step, "status": status_label, "result": agent_text, "good": False}
+            )
+            app.logger.info(f"Pipeline stopped: {status_label}")
+            return pipeline_result_store[-1]
+
+    if stage == "1":
+        pipeline_result_store.append(
+            {"step": step, "status": "ACCEPTED/SUFFICIENT", "result": agent_text, "good": True}
         )
-        final_output = step2_result
+        return pipeline_result_store[-1]
+
+    final_output = delimit_output_string(agent_text)
+    if stage != "4":
+        result = yield from formatted(final_output, prettify)
         pipeline_result_store.append(
-            {
-                "step": "2. Evidence Sort 1",
-                "status": status_label,
-                "result": prettify_output(step2_result),
-                "good": False,
-            }
+            {"step": step, "status": "COMPLETE", "result": result, "good": True}
         )
-        app.logger.info(f"Pipeline stopped: {status_label}")
         return pipeline_result_store[-1]
 
-    final_output = delimit_output_string(step2_result)
+    assessment = assess_case(final_output)
+
     pipeline_result_store.append(
         {
-            "step": "2. Evidence Sort 1",
+            "step": step,
             "status": "COMPLETE",
-            "result": prettify_output(final_output),
+            "result": final_output,
             "good": True,
+            "pros": assessment["pros"],
+            "cons": assessment["cons"],
+            "percent": assessment["percent"],
+            "rationale": assessment["rationale"],
         }
     )
-    previous_step_summary = final_output
 
+    app.logger.info("--- Pipeline Completed Successfully ---")
     return pipeline_result_store[-1]
 
 
-@app.post("/3")
-def run_3() -> List[Dict[str, str]]:
-    global pipeline_result_store
-    global file_context
+def run_stage(stage: str) -> Dict[str, Any]:
+    case = current_case()
+    with case.lock:
+        stopped = ingest_stage(stage, request.files.getlist("files[]"))
+        if stopped is not None:
+            return stopped
 
-    uploaded_files = request.files.getlist("files[]")
-    nuke_files()
-    save_files(uploaded_files)
+        agent_text, status = run_stage_agent(case, stage)
 
-    file_context += process_files_in_folder(DATA_FOLDER)
+        completion = complete_stage(stage, agent_text, status)
+        while True:
+            try:
+                next(completion)
+            except StopIteration as done:
+                return done.value
 
-    initial_data = file_context
 
-    # 4. STEP 3: Detailed Evidence Sorting - Phase 2 (Medical/Legal Verification)
-    app.logger.info(
-        "--- STEP 3: Detailed Evidence Sorting - Phase 2 (evidence_sorter_2) ---"
-    )
-
-    previous_step_summary = pipeline_result_store[-1]["result"]
-
-    step3_input = f"Previous Sort 1 Result:\n{previous_step_summary}\n\nCombined Raw Data:\n{initial_data}"
-    step3_prompt = f"{step3_input}\n\nAction: Wraggler2"
-
-    step3_result, status = callAgent(
-        step3_prompt, app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
-    )
-
-    if status != 200:
-        pipeline_result_store.append(
-            {
-                "step": "3. Evidence Sort 2",
-                "status": "ADK ERROR",
-                "result": prettify_output(step3_result),
-                "good": False,
-            }
-        )
-        return pipeline_result_store[-1]
+@app.post("/1")
+def run_1() -> Dict[str, Any]:
+    """
+    Executes the multi-step claims processing pipeline.
+    """
+    return run_stage("1")
 
-    recommendation = find_data_sufficiency(step3_result)
 
-    if recommendation in ["REJECT CASE", "INSUFFICIENT DATA"]:
-        status_label = (
-            "REJECTED" if recommendation == "REJECT CASE" else "INSUFFICIENT DATA"
-        )
-        final_output = step3_result
-        pipeline_result_store.append(
-            {
-                "step": "3. Evidence Sort 2",
-                "status": status_label,
-                "result": prettify_output(final_output),
-                "good": False,
-            }
-        )
-        app.logger.info(f"Pipeline stopped: {status_label}")
-        return pipeline_result_store[-1]
+@app.post("/2")
+def run_2() -> Dict[str, Any]:
+    return run_stage("2")
 
-    final_output = delimit_output_string(step3_result)
-    pipeline_result_store.append(
-        {
-            "step": "3. Evidence Sort 2",
-            "status": "COMPLETE",
-            "result": prettify_output(final_output),
-            "good": True,
-        }
-    )
-    previous_step_summary = final_output
 
-    return pipeline_result_store[-1]
+@app.post("/3")
+def run_3() -> Dict[str, Any]:
+    return run_stage("3")
 
 
 @app.post("/4")
-def run_4() -> List[Dict[str, str]]:
-    global pipeline_result_store
-    global file_context
+def run_4() -> Dict[str, Any]:
+    return run_stage("4")
 
-    uploaded_files = request.files.getlist("files[]")
-    nuke_files()
-    save_files(uploaded_files)
-
-    file_context += process_files_in_folder(DATA_FOLDER)
-
-    initial_data = file_context
-
-    # 5. STEP 4: Final Evidence Synthesis
-    app.logger.info("--- STEP 4: Final Evidence Synthesis (evidence_sorter_3) ---")
 
-    previous_step_summary = ""
-    for step in pipeline_result_store:
-        previous_step_summary += step["step"] + " -> " + step["result"] + "\n\n"
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-    step4_input = f"Results from Sort 3 Verification:\n{previous_step_summary}\n\nOriginal Raw Data:\n{initial_data}"
-    step4_prompt = f"{step4_input}\n\nAction: Wraggler3"
 
-    step4_result, status = callAgent(
-        step4_prompt, app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
-    )
-
-    if status != 200:
-        pipeline_result_store.append(
-            {
-                "step": "4. Final Synthesis",
-                "status": "ADK ERROR",
-                "result": prettify_output(step4_result),
-                "good": False,
-            }
-        )
-        return pipeline_result_store[-1]
+@app.post("/<any('1', '2', '3', '4'):stage>/stream")
+def run_stage_stream(stage: str) -> Response:
+    """
+    Streaming variant of /1../4 as Server-Sent Events: "status" events mark
+    each phase, "token" events carry agent and markdown-formatting text as
+    it is generated, and a final "result" event carries the record stored in
+    the case's results (the same body the blocking endpoint returns).
+    """
 
-    final_output = delimit_output_string(step4_result)
+    def forward(phase: str, source: Generator[str, None, Any]):
+        while True:
+            try:
+                delta = next(source)
+            except StopIteration as done:
+                return done.value
+            yield sse_event("token", {"phase": phase, "text": delta})
 
-    pros = (
-        call_gemini(
-            {
-                "systemInstruction": {
-                    "parts": [
-                        {
-                            "text": "You will be given information on a plaintiff law case. You will be given  an summary of the case with a recommended action. Upon reading the information decide and explain your reasoning on why the case SHOULD be taken on"
-                        }
-                    ]
-                },
-                "contents": [
-                    {
-                        "parts": [
-                            {"text": final_output},
-                        ]
-                    }
-                ],
-            }
-        ),
-    )
+    case = current_case()
+    uploaded_files = detach_files(request.files.getlist("files[]"))
 
-    cons = (
-        call_gemini(
-            {
-                "systemInstruction": {
-                    "parts": [
-                        {
-                            "text": "You will be given information on a plaintiff law case. You will be given  an summary of the case with a recommended action. Upon reading the information decide and explain your reasoning on why the case should NOT be taken on"
-                        }
-                    ]
-                },
-                "contents": [
-                    {
-                        "parts": [
-                            {"text": final_output},
-                        ]
-                    }
-                ],
-            },
-        ),
-    )
-
-    percent = (
-        call_gemini(
-            {
-                "systemInstruction": {
-                    "parts": [
-                        {
-                            "text": "You will be given information on a plaintiff law case. You will be given  an summary of the case with a recommended action. Upon reading the information decide on a percentage value from 0-100% to determine the value of the case from a law firm perspective. On the line immediately following write an explanation as to why you decided to rate the case that percentage value"
-                        }
-                    ]
-                },
-                "contents": [
-                    {
-                        "parts": [
-                            {"text": final_output},
-                        ]
-                    }
-                ],
-            }
-        ),
-    )
-
-    pipeline_result_store.append(
-        {
-            "step": "4. Final Synthesis",
-            "status": "COMPLETE",
-            "result": final_output,
-            "good": True,
-            "pros": pros,
-            "cons": cons,
-            "percent": percent,
-        }
+    def events() -> Iterator[str]:
+        try:
+            with case.lock:
+                yield sse_event("status", {"phase": "ingest", "step": STAGE_STEPS[stage]})
+                stopped = ingest_stage(stage, uploaded_files)
+                if stopped is not None:
+                    yield sse_event("result", stopped)
+                    return
+
+                yield sse_event("status", {"phase": "agent"})
+                prompt, session_id, state = prepare_stage_run(case, stage)
+                try:
+                    agent_text, status = yield from forward(
+                        "agent", stream_stage_agent(prompt, session_id, state)
+                    )
+                finally:
+                    finish_stage_run(case, session_id)
+
+                yield sse_event("status", {"phase": "format"})
+                record = yield from forward(
+                    "format", complete_stage(stage, agent_text, status, stream_prettify_output)
+                )
+                yield sse_event("result", record)
+        except Exception as e:
+            app.logger.exception(f"Streaming stage {stage} failed")
+            yield sse_event("error", {"message": str(e)})
+        finally:
+            for file in uploaded_files:
+                file.close()
+
+    return Response(
+        # The body runs after this view returns, outside the context that
+        # before_request set the deadline, cache bypass, and case in
+        stream_with_context(iterate_in_context(events())),
+        mimetype="text/event-stream",
+        # Proxies must not buffer the stream or the deltas arrive all at once
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    app.logger.info("--- Pipeline Completed Successfully ---")
-    return pipeline_result_store[-1]
-
 
 if __name__ == "__main__":
     # Create the data folder if it doesn't exist to prevent file I/O errors
@@ -1015,9 +2172,12 @@ if __name__ == "__main__":
 
     print(f"\n--- Starting Progressive Claims ADK Runner ---\n")
     print(f"ADK Agent: {APP_NAME}")
-    print(f"ADK Server URL: {API_URL}")
     print(f"Flask Runner URL: http://127.0.0.1:5000/run_batch_pipeline")
-    print(f"Waiting for ADK Server to start on {API_URL}...")
+    if embedded_agents is not None:
+        print(f"ADK Mode: embedded (agents from {ADK_AGENTS_DIR})")
+    else:
+        print(f"ADK Server URL: {API_URL}")
+        print(f"Waiting for ADK Server to start on {API_URL}...")
 
     # Set up basic logging
     import logging
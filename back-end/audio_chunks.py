@@ -0,0 +1,207 @@
+import os
+import re
+import shutil
+import subprocess
+from typing import List, NamedTuple, Optional, Tuple
+
+from retry_policy import current_deadline, remaining_seconds
+from streaming_body import MediaBuffer
+
+SILENCE_NOISE_DB = -50
+SILENCE_MIN_SECONDS = 0.5
+
+
+class AudioSegment(NamedTuple):
+    index: int
+    start: float
+    end: float
+    path: str
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+
+def _timeout(limit: Optional[float]) -> Optional[float]:
+    """Caps a subprocess at limit and at what is left of the request deadline."""
+    candidates = [t for t in (limit, remaining_seconds(current_deadline())) if t is not None]
+    if not candidates:
+        return None
+    return max(0.1, min(candidates))
+
+
+def format_timestamp(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours:d}:{minutes:02d}:{secs:02d}"
+    return f"{minutes:02d}:{secs:02d}"
+
+
+def probe_duration(path: str, timeout: Optional[float] = None) -> Optional[float]:
+    """Returns the container duration in seconds, or None if ffprobe cannot read it in time."""
+    try:
+        result = subprocess.run(
+            [
+                "ffprobe",
+                "-v",
+                "error",
+                "-show_entries",
+                "format=duration",
+                "-of",
+                "default=noprint_wrappers=1:nokey=1",
+                path,
+            ],
+            capture_output=True,
+            text=True,
+            timeout=_timeout(timeout),
+        )
+    except subprocess.TimeoutExpired:
+        return None
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+
+def detect_speech_bounds(
+    path: str, duration: float, timeout: Optional[float] = None
+) -> Tuple[float, float]:
+    """
+    Uses ffmpeg's silencedetect to find where leading silence ends and trailing
+    silence starts, so timestamps stay on the original timeline. Keeps the
+    full recording if the scan does not finish in time.
+    """
+    try:
+        result = subprocess.run(
+            [
+                "ffmpeg",
+                "-hide_banner",
+                "-nostats",
+                "-i",
+                path,
+                "-af",
+                f"silencedetect=noise={SILENCE_NOISE_DB}dB:d={SILENCE_MIN_SECONDS}",
+                "-f",
+                "null",
+                "-",
+            ],
+            capture_output=True,
+            text=True,
+            timeout=_timeout(timeout),
+        )
+    except subprocess.TimeoutExpired:
+        return 0.0, duration
+    starts = [float(v) for v in re.findall(r"silence_start: (-?[\d.]+)", result.stderr)]
+    ends = [float(v) for v in re.findall(r"silence_end: ([\d.]+)", result.stderr)]
+
+    speech_start, speech_end = 0.0, duration
+    if starts and ends and starts[0] <= 0.05:
+        speech_start = ends[0]
+    if starts and (len(ends) < len(starts) or ends[-1] >= duration - 0.05):
+        speech_end = starts[-1]
+
+    if speech_end - speech_start < SILENCE_MIN_SECONDS:
+        # Everything looks silent; transcribe the full file rather than nothing
+        return 0.0, duration
+    return max(0.0, speech_start), min(duration, speech_end)
+
+
+def _cut(
+    path: str, start: float, length: float, out_path: str, timeout: Optional[float] = None
+) -> str:
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-y",
+            "-ss",
+            f"{start:.3f}",
+            "-t",
+            f"{length:.3f}",
+            "-i",
+            path,
+            "-vn",
+            "-c",
+            "copy",
+            out_path,
+        ],
+        check=True,
+        capture_output=True,
+        timeout=_timeout(timeout),
+    )
+    return out_path
+
+
+def split_audio(
+    file_bytes: MediaBuffer,
+    workdir: str,
+    segment_seconds: float,
+    overlap_seconds: float,
+    trim_silence: bool = True,
+    timeout: Optional[float] = None,
+) -> List[AudioSegment]:
+    """
+    Splits an M4A recording into overlapping segment files under workdir, each
+    roughly segment_seconds long. Returns a single segment pointing at the
+    untouched copy of the recording when it is short or cannot be probed.
+    Each ffprobe/ffmpeg run is limited to timeout seconds and to the request
+    deadline; a cut that overruns raises subprocess.TimeoutExpired.
+    """
+    source_path = os.path.join(workdir, "source.m4a")
+    with open(source_path, "wb") as f:
+        f.write(file_bytes)
+
+    duration = probe_duration(source_path, timeout)
+    if duration is None:
+        return [AudioSegment(0, 0.0, 0.0, source_path)]
+
+    start, end = 0.0, duration
+    if trim_silence:
+        start, end = detect_speech_bounds(source_path, duration, timeout)
+
+    trimmed = start > 0.0 or end < duration
+    if end - start <= segment_seconds + overlap_seconds:
+        if not trimmed:
+            return [AudioSegment(0, 0.0, duration, source_path)]
+        out_path = os.path.join(workdir, "segment_0.m4a")
+        segment_path = _cut(source_path, start, end - start, out_path, timeout)
+        return [AudioSegment(0, start, end, segment_path)]
+
+    step = max(1.0, segment_seconds - overlap_seconds)
+    segments = []
+    segment_start = start
+    while segment_start < end:
+        segment_end = min(end, segment_start + segment_seconds)
+        index = len(segments)
+        out_path = os.path.join(workdir, f"segment_{index}.m4a")
+        _cut(source_path, segment_start, segment_end - segment_start, out_path, timeout)
+        segments.append(AudioSegment(index, segment_start, segment_end, out_path))
+        if segment_end >= end:
+            break
+        segment_start += step
+
+    return segments
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[\w']+", text.lower())
+
+
+def strip_overlap(previous_text: str, next_text: str, max_words: int = 80) -> str:
+    """
+    Drops the leading words of next_text that repeat the tail of previous_text,
+    which is what the segment overlap produces. Returns next_text unchanged if
+    no clean overlap is found.
+    """
+    previous_words = _words(previous_text)[-max_words:]
+    next_tokens = list(re.finditer(r"[\w']+", next_text))
+    next_words = [match.group(0).lower() for match in next_tokens[:max_words]]
+
+    for size in range(min(len(previous_words), len(next_words)), 2, -1):
+        if previous_words[-size:] == next_words[:size]:
+            cut_at = next_tokens[size - 1].end()
+            return next_text[cut_at:].lstrip(" ,.;:-\n")
+    return next_text
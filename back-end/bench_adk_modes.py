@@ -0,0 +1,149 @@
+"""
+Compares the per-run overhead of the two ADK modes: HTTP to a separately
+launched `adk api_server` versus an in-process Runner (ADK_MODE=embedded).
+
+Both modes run the same echo agent, which answers without calling a model,
+so the timings are transport only: JSON encoding of the prompt, the network
+hop, and the server's request handling versus a direct Runner call.
+
+Usage: python bench_adk_modes.py [--runs 20] [--sizes 10000,100000,500000]
+Requires google-adk (the `adk` CLI must be on PATH for the HTTP mode).
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from embedded_agents import EmbeddedAgents
+
+APP_NAME = "bench_echo"
+USER_ID = "bench_user"
+
+ECHO_AGENT = '''
+from google.adk.agents.base_agent import BaseAgent
+from google.adk.events.event import Event
+from google.genai import types
+
+
+class EchoAgent(BaseAgent):
+    async def _run_async_impl(self, ctx):
+        text = "".join(part.text or "" for part in ctx.user_content.parts)
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            content=types.Content(
+                role="model", parts=[types.Part(text=f"received {len(text)} chars")]
+            ),
+        )
+
+
+root_agent = EchoAgent(name="bench_echo")
+'''
+
+
+def write_echo_app(agents_dir: str):
+    app_dir = os.path.join(agents_dir, APP_NAME)
+    os.makedirs(app_dir)
+    with open(os.path.join(app_dir, "__init__.py"), "w") as f:
+        f.write("from . import agent\n")
+    with open(os.path.join(app_dir, "agent.py"), "w") as f:
+        f.write(ECHO_AGENT)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_api_server(agents_dir: str, port: int) -> subprocess.Popen:
+    server = subprocess.Popen(
+        ["adk", "api_server", "--port", str(port), agents_dir],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    for _ in range(120):
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/list-apps", timeout=1).ok:
+                return server
+        except requests.exceptions.ConnectionError:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("adk api_server did not start")
+
+
+def time_http(session: requests.Session, url: str, prompt: str, session_id: str) -> float:
+    payload = {
+        "app_name": APP_NAME,
+        "user_id": USER_ID,
+        "session_id": session_id,
+        "new_message": {"role": "user", "parts": [{"text": prompt}]},
+    }
+    start = time.perf_counter()
+    response = session.post(f"{url}/run", json=payload, timeout=120)
+    response.raise_for_status()
+    response.json()
+    return time.perf_counter() - start
+
+
+def time_embedded(agents: EmbeddedAgents, prompt: str, session_id: str) -> float:
+    start = time.perf_counter()
+    _, status = agents.call(prompt, APP_NAME, USER_ID, session_id)
+    if status != 200:
+        raise RuntimeError(f"embedded run failed with {status}")
+    return time.perf_counter() - start
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return statistics.median(ordered) * 1000, p95 * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--sizes", default="10000,100000,500000", help="prompt sizes in chars")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    with tempfile.TemporaryDirectory(prefix="adk_bench_") as agents_dir:
+        write_echo_app(agents_dir)
+        port = free_port()
+        server = start_api_server(agents_dir, port)
+        url = f"http://127.0.0.1:{port}"
+        agents = EmbeddedAgents(agents_dir, [APP_NAME])
+        http = requests.Session()
+        try:
+            print(f"{'prompt chars':>12} {'http p50':>10} {'http p95':>10} "
+                  f"{'embed p50':>10} {'embed p95':>10} {'saved p50':>10}")
+            for size in sizes:
+                prompt = ("The claimant reported damage to the vehicle. " * (size // 45 + 1))[:size]
+                session_id = f"bench_{size}"
+                http.post(f"{url}/apps/{APP_NAME}/users/{USER_ID}/sessions/{session_id}", json={})
+
+                # Warm up both paths (imports, connection, session creation)
+                time_http(http, url, prompt, session_id)
+                time_embedded(agents, prompt, session_id)
+
+                http_times = [time_http(http, url, prompt, session_id) for _ in range(args.runs)]
+                embedded_times = [time_embedded(agents, prompt, session_id) for _ in range(args.runs)]
+                http_p50, http_p95 = summarize(http_times)
+                embedded_p50, embedded_p95 = summarize(embedded_times)
+                print(f"{size:>12} {http_p50:>8.1f}ms {http_p95:>8.1f}ms "
+                      f"{embedded_p50:>8.1f}ms {embedded_p95:>8.1f}ms {http_p50 - embedded_p50:>8.1f}ms")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+import re
+from typing import Dict, List, Tuple
+
+from tokens import estimate_tokens
+
+# Extracted PDFs separate their page segments with PAGE_BREAK. Segments written
+# by Gemini (OCR of scanned pages, embedded photo analyses) start with one of
+# GENERATED_LABELS; lines repeated in them are prose, not page furniture.
+PAGE_BREAK = "\n\n\f"
+GENERATED_LABELS = ("[Scanned ", "[Embedded image ")
+
+# Page counters differ on every page ("Page 3 of 16") but are still boilerplate.
+_PAGE_NUMBER = re.compile(r"\b(page\s+)?\d+\s+(of|/)\s+\d+\b|\bpage\s+\d+\b", re.IGNORECASE)
+
+
+def _normalize(line: str) -> str:
+    return _PAGE_NUMBER.sub("#", " ".join(line.split())).lower()
+
+
+def _is_candidate(normalized: str, min_line_chars: int) -> bool:
+    # Short lines and bare form labels ("Claim Number :") carry structure, not boilerplate
+    return len(normalized) >= min_line_chars and not normalized.endswith(":")
+
+
+def strip_repeated_lines(
+    documents: List[str], min_line_chars: int = 20, min_occurrences: int = 3
+) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Removes letterheads, disclaimers, and page footers repeated across pages
+    and documents. Pages are the PAGE_BREAK separated segments of each
+    document, and only text-layer pages take part: a line found on at least
+    min_occurrences of them is boilerplate, and only its first (canonical)
+    occurrence is kept. Gemini-written segments are left untouched.
+    """
+    pages_per_line: Dict[str, int] = {}
+    for document in documents:
+        for page in document.split(PAGE_BREAK):
+            if page.startswith(GENERATED_LABELS):
+                continue
+            seen_on_page = set()
+            for line in page.split("\n"):
+                normalized = _normalize(line)
+                if _is_candidate(normalized, min_line_chars) and normalized not in seen_on_page:
+                    seen_on_page.add(normalized)
+                    pages_per_line[normalized] = pages_per_line.get(normalized, 0) + 1
+
+    boilerplate = {line for line, count in pages_per_line.items() if count >= min_occurrences}
+
+    kept = set()
+    lines_removed = 0
+    stripped_documents = []
+    for document in documents:
+        pages = []
+        for page in document.split(PAGE_BREAK):
+            if page.startswith(GENERATED_LABELS):
+                pages.append(page)
+                continue
+            lines = []
+            for line in page.split("\n"):
+                normalized = _normalize(line)
+                if normalized in boilerplate:
+                    if normalized in kept:
+                        lines_removed += 1
+                        continue
+                    kept.add(normalized)
+                lines.append(line)
+            if lines:
+                pages.append("\n".join(lines))
+        stripped_documents.append(PAGE_BREAK.join(pages))
+
+    chars_before = sum(len(d) for d in documents)
+    chars_after = sum(len(d) for d in stripped_documents)
+    tokens_before = sum(estimate_tokens(d) for d in documents)
+    tokens_after = sum(estimate_tokens(d) for d in stripped_documents)
+    return stripped_documents, {
+        "boilerplate_lines": len(boilerplate),
+        "lines_removed": lines_removed,
+        "chars_saved": chars_before - chars_after,
+        "tokens_saved": tokens_before - tokens_after,
+    }
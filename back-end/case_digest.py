@@ -0,0 +1,77 @@
+from concurrent.futures import Executor
+from typing import Callable, List
+
+from tokens import CHARS_PER_TOKEN, estimate_tokens
+
+
+def chunk_text(text: str, chunk_tokens: int) -> List[str]:
+    """
+    Splits text into chunks of about chunk_tokens, breaking at page (blank
+    line) boundaries first, then at line breaks, and only then mid-line.
+    """
+    max_chars = max(1, chunk_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return [text] if text.strip() else []
+
+    pieces: List[str] = []
+    for block in text.split("\n\n"):
+        if len(block) <= max_chars:
+            pieces.append(block)
+            continue
+        for line in block.split("\n"):
+            while len(line) > max_chars:
+                pieces.append(line[:max_chars])
+                line = line[max_chars:]
+            pieces.append(line)
+
+    chunks: List[str] = []
+    current = ""
+    for piece in pieces:
+        candidate = f"{current}\n\n{piece}" if current else piece
+        if len(candidate) > max_chars and current:
+            chunks.append(current)
+            current = piece
+        else:
+            current = candidate
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+def summarize_document(
+    text: str,
+    chunk_tokens: int,
+    summarize_chunk: Callable[[str], str],
+    pool: Executor,
+) -> str:
+    """Map step: summarizes the chunks of one document in parallel, in order."""
+    chunks = chunk_text(text, chunk_tokens)
+    summaries = list(pool.map(summarize_chunk, chunks))
+    if len(summaries) == 1:
+        return summaries[0]
+    return "\n\n".join(
+        f"[Part {i + 1}/{len(summaries)}]\n{summary}" for i, summary in enumerate(summaries)
+    )
+
+
+def reduce_summaries(
+    summaries: List[str],
+    chunk_tokens: int,
+    reduce_batch: Callable[[str], str],
+    pool: Executor,
+) -> str:
+    """
+    Reduce step: merges document summaries into one digest. Batches that do
+    not fit in one call are reduced separately and merged again.
+    """
+    text = "\n\n".join(summaries)
+    while True:
+        batches = chunk_text(text, chunk_tokens)
+        if len(batches) <= 1:
+            return reduce_batch(text)
+        reduced = list(pool.map(reduce_batch, batches))
+        merged = "\n\n".join(reduced)
+        if estimate_tokens(merged) >= estimate_tokens(text):
+            # The model is not shrinking the text; stop instead of looping
+            return merged
+        text = merged
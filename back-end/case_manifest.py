@@ -0,0 +1,140 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from boilerplate import strip_repeated_lines
+from retrieval import BM25Index
+
+
+class CaseManifest:
+    """
+    Per-case record of every ingested document, keyed by the SHA-256 of its bytes.
+    Each document keeps its extracted section text and the stage that first
+    supplied it; later uploads of the same bytes are recorded as references so
+    the case context includes every document exactly once.
+    """
+
+    def __init__(
+        self,
+        strip_boilerplate: bool = False,
+        min_line_chars: int = 20,
+        min_occurrences: int = 3,
+        index: Optional[BM25Index] = None,
+    ):
+        self._documents: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.strip_boilerplate = strip_boilerplate
+        self.min_line_chars = min_line_chars
+        self.min_occurrences = min_occurrences
+        # Retrieval index over the case's chunks, filled as documents are added
+        self.index = index
+        self.normalization_stats: Dict[str, int] = {}
+        # (document digests, text) of the last map-reduce case digest
+        self.case_digest: Optional[Tuple[Tuple[str, ...], str]] = None
+
+    def __contains__(self, digest: str) -> bool:
+        with self._lock:
+            return digest in self._documents
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._documents)
+
+    def clear(self):
+        """Forgets every document, starting a new case."""
+        with self._lock:
+            self._documents.clear()
+            self.normalization_stats = {}
+            self.case_digest = None
+        if self.index is not None:
+            self.index.clear()
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            document = self._documents.get(digest)
+            return dict(document) if document else None
+
+    def add(self, digest: str, file_name: str, kind: str, section: str, stage: str) -> bool:
+        """Stores a newly extracted document; returns False if it was already known."""
+        with self._lock:
+            if digest in self._documents:
+                self._documents[digest]["references"].append(
+                    {"file": file_name, "stage": stage}
+                )
+                return False
+            self._documents[digest] = {
+                "sha256": digest,
+                "file": file_name,
+                "kind": kind,
+                "stage": stage,
+                "section": section,
+                "summary": None,
+                "references": [],
+            }
+        if self.index is not None:
+            self.index.add_document(digest, f"{kind.upper()}: {file_name}", section)
+        return True
+
+    def set_summary(self, digest: str, summary: str):
+        """Stores the map-step summary of a document for later digests."""
+        with self._lock:
+            if digest in self._documents:
+                self._documents[digest]["summary"] = summary
+
+    def add_reference(self, digest: str, file_name: str, stage: str) -> bool:
+        """Records a re-upload of a known document; returns False if the digest is unknown."""
+        with self._lock:
+            document = self._documents.get(digest)
+            if document is None:
+                return False
+            document["references"].append({"file": file_name, "stage": stage})
+            return True
+
+    def documents(self) -> List[Dict[str, Any]]:
+        """Documents in first-ingested order."""
+        with self._lock:
+            return [dict(document) for document in self._documents.values()]
+
+    def render(self) -> str:
+        """The case context: every document's section once, in first-ingested order."""
+        return "\n\n".join(self.render_sections())
+
+    def render_sections(self) -> List[str]:
+        """
+        Document sections in first-ingested order. With boilerplate stripping on,
+        lines repeated across PDF pages and documents are kept only where they
+        first appear.
+        """
+        with self._lock:
+            sections = [d["section"] for d in self._documents.values()]
+            if not self.strip_boilerplate:
+                return sections
+
+            pdf_indexes = [
+                i for i, d in enumerate(self._documents.values()) if d["kind"] == "pdf"
+            ]
+            stripped, stats = strip_repeated_lines(
+                [sections[i] for i in pdf_indexes],
+                min_line_chars=self.min_line_chars,
+                min_occurrences=self.min_occurrences,
+            )
+            for i, section in zip(pdf_indexes, stripped):
+                sections[i] = section
+            self.normalization_stats = stats
+            return sections
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Manifest listing without the extracted text."""
+        with self._lock:
+            return [
+                {
+                    "sha256": d["sha256"],
+                    "file": d["file"],
+                    "kind": d["kind"],
+                    "stage": d["stage"],
+                    "characters": len(d["section"]),
+                    "summarized": d["summary"] is not None,
+                    "references": list(d["references"]),
+                }
+                for d in self._documents.values()
+            ]
@@ -0,0 +1,151 @@
+import contextvars
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from case_manifest import CaseManifest
+
+DEFAULT_CASE_ID = "default"
+_CASE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class Case:
+    """One case's ADK session, upload folder, stage results, and documents."""
+
+    def __init__(self, case_id: str, session_id: str, upload_dir: str, manifest: CaseManifest):
+        self.case_id = case_id
+        self.session_id = session_id
+        self.upload_dir = upload_dir
+        self.manifest = manifest
+        self.results: List[Dict[str, Any]] = []
+        self.file_context = ""
+        # Estimated tokens of each stage's last prompt
+        self.prompt_tokens: Dict[str, int] = {}
+        # Serializes stages of this case; different cases run concurrently
+        self.lock = threading.RLock()
+        self.created_at = time.time()
+        self.last_used = self.created_at
+
+    def reset(self):
+        """Starts the case over, as stage 1 does."""
+        self.results.clear()
+        self.file_context = ""
+        self.prompt_tokens.clear()
+        self.manifest.clear()
+
+    def touch(self):
+        self.last_used = time.time()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "case_id": self.case_id,
+            "session_id": self.session_id,
+            "created_at": self.created_at,
+            "last_used": self.last_used,
+            "steps": [r.get("step") for r in self.results],
+            "documents": len(self.manifest),
+            "prompt_tokens": dict(self.prompt_tokens),
+        }
+
+
+# The case the current request works on, set per request like the deadline
+_current: contextvars.ContextVar[Optional[Case]] = contextvars.ContextVar(
+    "current_case", default=None
+)
+
+
+def set_current_case(case: Case) -> contextvars.Token:
+    return _current.set(case)
+
+
+def reset_current_case(token: contextvars.Token):
+    _current.reset(token)
+
+
+def current_case() -> Case:
+    case = _current.get()
+    if case is None:
+        raise RuntimeError("No case is active in this context.")
+    return case
+
+
+class CaseRegistry:
+    """
+    Cases issued by the API, each with its own ADK session ("case_<id>") and
+    upload folder under root. Requests without a case ID use the default
+    case, which keeps the legacy folder and session. Cases idle for longer
+    than idle_ttl_seconds are dropped together with their uploads.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        new_manifest: Callable[[], CaseManifest],
+        default_folder: str,
+        default_session_id: str,
+        idle_ttl_seconds: float = 86400.0,
+    ):
+        self.root = root
+        self.new_manifest = new_manifest
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._cases: Dict[str, Case] = {}
+        self._lock = threading.Lock()
+        self.default = Case(DEFAULT_CASE_ID, default_session_id, default_folder, new_manifest())
+
+    @staticmethod
+    def valid_id(case_id: str) -> bool:
+        return bool(_CASE_ID.match(case_id))
+
+    def create(self) -> Case:
+        self.evict_idle()
+        case_id = uuid.uuid4().hex
+        case = Case(
+            case_id, f"case_{case_id}", os.path.join(self.root, case_id), self.new_manifest()
+        )
+        os.makedirs(case.upload_dir, exist_ok=True)
+        with self._lock:
+            self._cases[case_id] = case
+        return case
+
+    def get(self, case_id: Optional[str]) -> Optional[Case]:
+        """The case for an ID, the default case for none, or None if unknown."""
+        if not case_id or case_id == DEFAULT_CASE_ID:
+            case = self.default
+        else:
+            with self._lock:
+                case = self._cases.get(case_id)
+        if case is not None:
+            case.touch()
+        return case
+
+    def delete(self, case_id: str) -> bool:
+        with self._lock:
+            case = self._cases.pop(case_id, None)
+        if case is None:
+            return False
+        shutil.rmtree(case.upload_dir, ignore_errors=True)
+        return True
+
+    def evict_idle(self):
+        if self.idle_ttl_seconds <= 0:
+            return
+        cutoff = time.time() - self.idle_ttl_seconds
+        with self._lock:
+            idle = [
+                case_id
+                for case_id, case in self._cases.items()
+                # A case whose stage is running is not idle
+                if case.last_used < cutoff and case.lock.acquire(blocking=False)
+            ]
+            for case_id in idle:
+                self._cases[case_id].lock.release()
+        for case_id in idle:
+            self.delete(case_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"cases": len(self._cases), "idle_ttl_seconds": self.idle_ttl_seconds}
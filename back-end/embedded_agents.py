@@ -0,0 +1,199 @@
+import asyncio
+import importlib
+import queue
+import sys
+import threading
+from typing import Any, Dict, Generator, List, Optional, Tuple
+
+from retry_policy import current_deadline, remaining_seconds
+
+
+class EmbeddedAgents:
+    """
+    Runs the ADK apps in this process instead of over HTTP to adk api_server:
+    one Runner per app, all sharing an in-memory session service, driven on
+    a dedicated event loop thread. Apps are imported the way adk api_server
+    loads them, as top-level packages from agents_dir. The prompt is handed
+    over as an object, with no JSON encoding or network hop. Like the HTTP
+    read timeout, timeout_seconds bounds each wait for the next event.
+    """
+
+    def __init__(self, agents_dir: str, app_names: List[str], timeout_seconds: float = 60.0):
+        self.agents_dir = agents_dir
+        self.app_names = app_names
+        self.timeout_seconds = timeout_seconds
+        self._runners: Dict[str, Any] = {}
+        self._load_errors: Dict[str, str] = {}
+        self._session_service = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._start_lock = threading.Lock()
+        self._stats = {"runs": 0, "failures": 0, "sessions_created": 0}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                # ADK is only needed in this mode, so it is imported here
+                from google.adk.runners import Runner
+                from google.adk.sessions import InMemorySessionService
+
+                if self.agents_dir not in sys.path:
+                    sys.path.insert(0, self.agents_dir)
+                self._session_service = InMemorySessionService()
+                for app_name in self.app_names:
+                    try:
+                        module = importlib.import_module(f"{app_name}.agent")
+                    except Exception as e:
+                        # A missing app surfaces as a failed run, so callers can fall back
+                        self._load_errors[app_name] = str(e)
+                        continue
+                    self._runners[app_name] = Runner(
+                        app_name=app_name,
+                        agent=module.root_agent,
+                        session_service=self._session_service,
+                    )
+
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="adk-loop", daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    async def _events(
+        self,
+        prompt: str,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        streaming: bool,
+        state: Optional[Dict[str, Any]],
+    ):
+        from google.adk.agents.run_config import RunConfig, StreamingMode
+        from google.genai import types
+
+        runner = self._runners[app_name]
+        session = await self._session_service.get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        )
+        if session is None:
+            await self._session_service.create_session(
+                app_name=app_name, user_id=user_id, session_id=session_id, state=state or {}
+            )
+            self._stats["sessions_created"] += 1
+
+        run_config = RunConfig(streaming_mode=StreamingMode.SSE if streaming else StreamingMode.NONE)
+        message = types.Content(role="user", parts=[types.Part(text=prompt)])
+        async for event in runner.run_async(
+            user_id=user_id, session_id=session_id, new_message=message, run_config=run_config
+        ):
+            yield event
+
+    def stream(
+        self,
+        prompt: str,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        streaming: bool = True,
+        state: Optional[Dict[str, Any]] = None,
+    ) -> Generator[str, None, Tuple[str, int]]:
+        """
+        Runs the app on one prompt, yielding text deltas, and returns (final
+        text, status) with the same semantics as the HTTP path: the final text
+        is the last complete event with text. state seeds a new session.
+        """
+        loop = self._ensure_loop()
+        if app_name not in self._runners:
+            detail = self._load_errors.get(app_name, "not configured")
+            return (f"Error 404: ADK app {app_name} is not available: {detail}", 404)
+
+        deltas: "queue.Queue[Any]" = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for event in self._events(
+                    prompt, app_name, user_id, session_id, streaming, state
+                ):
+                    deltas.put(event)
+            except Exception as e:
+                deltas.put(e)
+            finally:
+                deltas.put(done)
+
+        self._stats["runs"] += 1
+        future = asyncio.run_coroutine_threadsafe(pump(), loop)
+        deadline = current_deadline()
+        final_text = None
+        partial_text: List[str] = []
+        try:
+            while True:
+                remaining = remaining_seconds(deadline)
+                wait = self.timeout_seconds
+                if remaining is not None:
+                    wait = max(0.0, min(wait, remaining))
+                try:
+                    item = deltas.get(timeout=wait)
+                except queue.Empty:
+                    self._stats["failures"] += 1
+                    if remaining is not None and remaining <= wait:
+                        return ("AGENT CRITICAL ERROR: Request deadline exceeded.", 504)
+                    return (
+                        f"AGENT CRITICAL ERROR: ADK run timed out (over {self.timeout_seconds:g} "
+                        "seconds). Agent may be stuck.",
+                        504,
+                    )
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    self._stats["failures"] += 1
+                    return (
+                        f"AGENT CRITICAL ERROR: An unexpected error occurred during ADK run: {item}",
+                        500,
+                    )
+                parts = item.content.parts if item.content and item.content.parts else []
+                text = "".join(part.text for part in parts if part.text)
+                if not text:
+                    continue
+                if item.partial:
+                    partial_text.append(text)
+                    yield text
+                else:
+                    # A complete event repeats the partials before it
+                    if not partial_text:
+                        yield text
+                    final_text = text
+                    partial_text = []
+        finally:
+            future.cancel()
+
+        if final_text is None:
+            final_text = "".join(partial_text)
+        final_text = final_text.strip()
+        return (final_text or "No text found in agent response.", 200)
+
+    def call(
+        self,
+        prompt: str,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        state: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, int]:
+        """Blocking run returning (final text, status), like callAgent()."""
+        run = self.stream(prompt, app_name, user_id, session_id, streaming=False, state=state)
+        while True:
+            try:
+                next(run)
+            except StopIteration as done:
+                return done.value
+
+    def delete_session(self, app_name: str, user_id: str, session_id: str):
+        loop = self._ensure_loop()
+        asyncio.run_coroutine_threadsafe(
+            self._session_service.delete_session(
+                app_name=app_name, user_id=user_id, session_id=session_id
+            ),
+            loop,
+        ).result()
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats, apps=sorted(self._runners), load_errors=self._load_errors)
@@ -0,0 +1,160 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class PartialExtraction(str):
+    """
+    Extracted text in which some parts (pages, photos, audio segments) failed
+    and are marked as such. Returned to the caller but never cached, so the
+    next upload of the file tries the failed parts again.
+    """
+
+
+class ExtractionCache:
+    """
+    Persistent, content-addressed cache for extracted file text.
+    Entries are keyed by the SHA-256 of the file bytes plus the extractor name,
+    prompt, and model version, stored in SQLite and evicted LRU by total size.
+    """
+
+    def __init__(self, db_path: str, max_bytes: int):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    extractor TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite handles cross-process locking."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(file_bytes: bytes, extractor: str, prompt: str, model: str) -> str:
+        """Builds the cache key from the file digest and the extraction settings."""
+        file_digest = hashlib.sha256(file_bytes).hexdigest()
+        settings_digest = hashlib.sha256(
+            f"{extractor}\x00{prompt}\x00{model}".encode("utf-8")
+        ).hexdigest()
+        return f"{file_digest}:{settings_digest}"
+
+    def _bump(self, conn: sqlite3.Connection, name: str, amount: int = 1):
+        conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def get(self, key: str, extractor: str = "") -> Optional[str]:
+        """Returns the cached content for key, or None on a miss."""
+        with self._write_lock:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT content FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            outcome = "hits" if row else "misses"
+            if row:
+                conn.execute(
+                    "UPDATE entries SET last_access = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+            self._bump(conn, outcome)
+            if extractor:
+                self._bump(conn, f"{extractor}.{outcome}")
+            conn.commit()
+        return row[0] if row else None
+
+    def contains(self, key: str) -> bool:
+        """Checks for key without touching recency or hit/miss counters."""
+        with self._write_lock:
+            row = self._conn().execute(
+                "SELECT 1 FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        return row is not None
+
+    def put(self, key: str, extractor: str, content: str):
+        """Stores content under key and evicts least recently used entries over the size limit."""
+        size = len(content.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, extractor, content, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, extractor, content, size, now, now),
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        rows = conn.execute(
+            "SELECT key, size FROM entries ORDER BY last_access ASC"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self._bump(conn, "evictions", evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss/eviction counters plus current entry count and size."""
+        with self._write_lock:
+            conn = self._conn()
+            counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            entries, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        lookups = hits + misses
+        return {
+            **counters,
+            "entries": entries,
+            "size_bytes": total,
+            "max_bytes": self.max_bytes,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,392 @@
+import asyncio
+import json
+import queue
+import re
+import sqlite3
+import threading
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TypeVar,
+    Union,
+)
+
+import httpx
+
+from rate_limiter import AdaptiveConcurrency, SharedRateLimiter
+from retry_policy import CircuitBreaker, RetryPolicy, current_deadline, parse_retry_after
+from streaming_body import InlineDataBody
+from tokens import CHARS_PER_TOKEN, TOKENS_PER_PDF_PAGE
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Gemini's RetryInfo detail, e.g. "retryDelay": "17s", sent with quota errors
+_RETRY_DELAY = re.compile(r'"retryDelay"\s*:\s*"(\d+(?:\.\d+)?)s"')
+
+T = TypeVar("T")
+Payload = Union[Dict[str, Any], InlineDataBody]
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+    if retry_after is None:
+        match = _RETRY_DELAY.search(response.text)
+        if match:
+            retry_after = float(match.group(1))
+    return retry_after
+
+
+# Rough media cost for quota accounting: audio runs ~2 tokens per KB at common
+# bitrates, and images/PDF pages cost at least one tile.
+MEDIA_BYTES_PER_TOKEN = 512
+
+
+def estimate_request_tokens(payload: "Payload") -> int:
+    """Input tokens a request will likely be billed, for TPM accounting."""
+    if isinstance(payload, InlineDataBody):
+        text_tokens = payload.text_bytes // CHARS_PER_TOKEN
+        return text_tokens + max(TOKENS_PER_PDF_PAGE, payload.media_bytes // MEDIA_BYTES_PER_TOKEN)
+    return len(json.dumps(payload)) // CHARS_PER_TOKEN
+
+
+def response_text(gemini_response: Optional[Dict[str, Any]]) -> str:
+    """Text of the first candidate part, or "" if the response has none."""
+    return (
+        (gemini_response or {})
+        .get("candidates", [{}])[0]
+        .get("content", {})
+        .get("parts", [{}])[0]
+        .get("text", "")
+    )
+
+
+class GeminiClient:
+    """
+    Asyncio Gemini client running on its own event loop thread. Every request,
+    from any thread, goes through one httpx.AsyncClient and one concurrency
+    limit, so in-flight model calls are capped process-wide while a single
+    caller can overlap many of them with batch(). The limit backs off
+    multiplicatively on 429s and grows back additively; an optional shared
+    rate limiter keeps all processes under the RPM/TPM quota.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        api_key: Optional[str],
+        max_concurrency: int = 16,
+        policy: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        rate_limiter: Optional[SharedRateLimiter] = None,
+        adaptive: bool = True,
+    ):
+        self.api_url = api_url
+        self.stream_url = api_url.replace(":generateContent", ":streamGenerateContent")
+        self.api_key = api_key
+        self.max_concurrency = max(1, max_concurrency)
+        self.policy = policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker("gemini")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self.rate_limiter = rate_limiter
+        # Without adaptation the limit never moves, which is a plain semaphore
+        self.concurrency = AdaptiveConcurrency(
+            self.max_concurrency, initial=self.max_concurrency
+        )
+        self.adaptive = adaptive
+        self._start_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "in_flight": 0,
+            "peak_in_flight": 0,
+            "connections_opened": 0,
+        }
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        # Started lazily so forked worker processes each get their own loop thread
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    self._client = httpx.AsyncClient(
+                        timeout=httpx.Timeout(self.policy.attempt_timeout, connect=10.0),
+                        limits=httpx.Limits(
+                            max_connections=self.max_concurrency,
+                            max_keepalive_connections=self.max_concurrency,
+                        ),
+                    )
+                    ready.set()
+                    loop.run_forever()
+
+                threading.Thread(target=run, name="gemini-loop", daemon=True).start()
+                ready.wait()
+                self._loop = loop
+        return self._loop
+
+    async def _trace(self, event: str, info: Dict[str, Any]):
+        """httpcore trace hook: counts the TCP connections the pool opens."""
+        if event == "connection.connect_tcp.complete":
+            self._stats["connections_opened"] += 1
+
+    @staticmethod
+    def _encode(payload: Payload):
+        """Returns (streamed, content, headers) for a request body."""
+        streamed = isinstance(payload, InlineDataBody)
+        if streamed:
+            # Streamed bodies need an explicit length or httpx falls back to chunked encoding
+            content, length = payload, len(payload)
+        else:
+            content = json.dumps(payload).encode("utf-8")
+            length = len(content)
+        headers = {"Content-Type": "application/json", "Content-Length": str(length)}
+        return streamed, content, headers
+
+    async def generate(
+        self,
+        payload: Payload,
+        max_attempts: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Sends one generateContent request under the retry policy and circuit
+        breaker. deadline is the caller's time.monotonic() budget; context
+        variables do not cross into the loop thread, so it is passed explicitly.
+        """
+        self._ensure_loop()
+        streamed, content, headers = self._encode(payload)
+        estimated_tokens = estimate_request_tokens(payload)
+
+        delay = self.policy.base_delay
+        attempt = 0
+        while True:
+            await self._acquire_quota(estimated_tokens)
+            async with self.concurrency:
+                timeout = self.policy.attempt_timeout_for(deadline)
+                self.breaker.before_call()
+                self._stats["requests"] += 1
+                self._stats["in_flight"] += 1
+                self._stats["peak_in_flight"] = max(
+                    self._stats["peak_in_flight"], self._stats["in_flight"]
+                )
+                try:
+                    response = await self._client.post(
+                        self.api_url,
+                        params={"key": self.api_key},
+                        headers=headers,
+                        # httpx treats anything iterable as a sync stream; hand it the async one
+                        content=aiter(content) if streamed else content,
+                        timeout=httpx.Timeout(timeout, connect=min(10.0, timeout)),
+                        extensions={"trace": self._trace},
+                    )
+                except httpx.TransportError:
+                    self.breaker.record_failure()
+                    delay = self.policy.next_delay(attempt, delay, None, deadline, max_attempts)
+                    if delay is None:
+                        self._stats["failures"] += 1
+                        raise
+                    response = None
+                except Exception:
+                    self.breaker.record_failure()
+                    self._stats["failures"] += 1
+                    raise
+                except BaseException:
+                    # Cancelled (e.g. the caller went away): no outcome to record
+                    self.breaker.record_cancelled()
+                    raise
+                finally:
+                    self._stats["in_flight"] -= 1
+
+            if response is not None:
+                # Throttling is not an outage; only server errors trip the breaker
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if response.status_code == 429 and self.adaptive:
+                    self.concurrency.on_throttle()
+                if response.status_code < 400:
+                    if self.adaptive:
+                        self.concurrency.on_success()
+                    result = response.json()
+                    await self._reconcile_tokens(result, estimated_tokens)
+                    return result
+                if response.status_code in RETRY_STATUS_CODES:
+                    delay = self.policy.next_delay(
+                        attempt, delay, _retry_after(response), deadline, max_attempts
+                    )
+                else:
+                    delay = None
+                if delay is None:
+                    self._stats["failures"] += 1
+                    response.raise_for_status()
+
+            self._stats["retries"] += 1
+            # Back off outside the concurrency limit so waiting requests can use the slot
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def stream(
+        self, payload: Payload, deadline: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """
+        streamGenerateContent over SSE, yielding text deltas as they arrive.
+        Not retried: once text has been forwarded a retry would repeat it.
+        """
+        self._ensure_loop()
+        streamed, content, headers = self._encode(payload)
+        await self._acquire_quota(estimate_request_tokens(payload))
+        async with self.concurrency:
+            timeout = self.policy.attempt_timeout_for(deadline)
+            self.breaker.before_call()
+            self._stats["requests"] += 1
+            try:
+                async with self._client.stream(
+                    "POST",
+                    self.stream_url,
+                    params={"key": self.api_key, "alt": "sse"},
+                    headers=headers,
+                    content=aiter(content) if streamed else content,
+                    timeout=httpx.Timeout(timeout, connect=min(10.0, timeout)),
+                    extensions={"trace": self._trace},
+                ) as response:
+                    if response.status_code >= 500:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                    if response.status_code == 429 and self.adaptive:
+                        self.concurrency.on_throttle()
+                    if response.status_code >= 400:
+                        await response.aread()
+                        self._stats["failures"] += 1
+                        response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        text = response_text(json.loads(line[5:]))
+                        if text:
+                            yield text
+            except httpx.TransportError:
+                self.breaker.record_failure()
+                self._stats["failures"] += 1
+                raise
+            except BaseException:
+                # Cancelled by stream_sync when the consumer stops; a probe still
+                # waiting on its response must not keep the circuit half-open
+                self.breaker.record_cancelled()
+                raise
+
+    async def _acquire_quota(self, estimated_tokens: int):
+        if self.rate_limiter is None:
+            return
+        try:
+            await self.rate_limiter.acquire(estimated_tokens)
+        except sqlite3.Error:
+            # A broken quota store must not stop model calls; 429s still back off
+            pass
+
+    async def _reconcile_tokens(self, result: Dict[str, Any], estimated_tokens: int):
+        """Corrects the TPM bucket with the prompt tokens Gemini reports."""
+        if self.rate_limiter is None:
+            return
+        actual = (result.get("usageMetadata") or {}).get("promptTokenCount")
+        if actual is None:
+            return
+        try:
+            await asyncio.to_thread(self.rate_limiter.adjust, estimated_tokens - int(actual))
+        except sqlite3.Error:
+            pass
+
+    async def gather(
+        self,
+        payloads: Sequence[Payload],
+        limit: Optional[int] = None,
+        return_exceptions: bool = False,
+        deadline: Optional[float] = None,
+    ) -> List[Any]:
+        """Runs many requests concurrently; limit caps this batch below the global cap."""
+        if limit:
+            batch_semaphore = asyncio.Semaphore(limit)
+
+            async def limited(payload: Payload):
+                async with batch_semaphore:
+                    return await self.generate(payload, deadline=deadline)
+
+            tasks = [limited(p) for p in payloads]
+        else:
+            tasks = [self.generate(p, deadline=deadline) for p in payloads]
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+
+    def run(self, coroutine: Awaitable[T]) -> T:
+        """Runs a coroutine on the client's loop and blocks the calling thread for its result."""
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    def generate_sync(self, payload: Payload, max_attempts: Optional[int] = None) -> Dict[str, Any]:
+        """Blocking generate() carrying the calling thread's request deadline."""
+        return self.run(self.generate(payload, max_attempts, current_deadline()))
+
+    def stream_sync(self, payload: Payload) -> Iterator[str]:
+        """Blocking iterator over stream() for synchronous callers."""
+        loop = self._ensure_loop()
+        deadline = current_deadline()
+        deltas: "queue.Queue[Any]" = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for delta in self.stream(payload, deadline):
+                    deltas.put(delta)
+            except Exception as e:
+                deltas.put(e)
+            finally:
+                deltas.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), loop)
+        try:
+            while True:
+                item = deltas.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # The consumer stopped early (e.g. the browser disconnected)
+            future.cancel()
+
+    def batch(
+        self,
+        payloads: Sequence[Payload],
+        limit: Optional[int] = None,
+        return_exceptions: bool = False,
+    ) -> List[Any]:
+        """Blocking gather() for synchronous callers; results are in payload order."""
+        if not payloads:
+            return []
+        return self.run(self.gather(payloads, limit, return_exceptions, current_deadline()))
+
+    def stats(self) -> Dict[str, Any]:
+        # Requests beyond the connections opened went out on kept-alive ones
+        sent, opened = self._stats["requests"], self._stats["connections_opened"]
+        reused = max(0, sent - opened)
+        stats = dict(
+            self._stats,
+            reused_requests=reused,
+            reuse_rate=round(reused / sent, 3) if sent else 0.0,
+            max_concurrency=self.max_concurrency,
+            concurrency=self.concurrency.stats(),
+            breaker=self.breaker.stats(),
+        )
+        if self.rate_limiter is not None:
+            stats["rate_limiter"] = self.rate_limiter.stats()
+        return stats
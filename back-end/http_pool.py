@@ -0,0 +1,68 @@
+import threading
+from typing import Any, Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PooledHTTP:
+    """
+    Keep-alive HTTP client for the ADK server calls (Gemini has its own httpx
+    pool in GeminiClient). Each thread gets its own requests.Session (sessions
+    are not thread-safe), but all of them mount the same adapter, so
+    connections are pooled and reused across threads and requests.
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 32):
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self.adapter)
+            session.mount("http://", self.adapter)
+            self._local.session = session
+        return session
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.session.get(url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.session.post(url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.session.delete(url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Connection reuse per host, from urllib3's pool counters: requests
+        beyond the number of connections opened were served on kept-alive ones.
+        Pools evicted by the pool manager drop out of the totals.
+        """
+        hosts = {}
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.scheme}://{pool.host}:{pool.port}"
+            hosts[host] = {
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                "idle_connections": pool.pool.qsize() if pool.pool else 0,
+            }
+        opened = sum(h["connections_opened"] for h in hosts.values())
+        sent = sum(h["requests"] for h in hosts.values())
+        reused = max(0, sent - opened)
+        return {
+            "hosts": hosts,
+            "connections_opened": opened,
+            "requests": sent,
+            "reused_requests": reused,
+            "reuse_rate": round(reused / sent, 3) if sent else 0.0,
+        }
@@ -0,0 +1,97 @@
+import io
+import threading
+from typing import Dict, NamedTuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# PNGs with more distinct colors than this are treated as photos and may be
+# re-encoded as JPEG; screenshots and scanned text stay lossless.
+PHOTO_COLOR_THRESHOLD = 4096
+
+
+class PreparedImage(NamedTuple):
+    data: bytes
+    mime_type: str
+    original_bytes: int
+    prepared_bytes: int
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - self.prepared_bytes
+
+
+_stats_lock = threading.Lock()
+_stats = {"files": 0, "original_bytes": 0, "prepared_bytes": 0}
+
+
+def _is_photographic(image: Image.Image) -> bool:
+    """Opaque images with many distinct colors survive JPEG without hurting OCR."""
+    if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+        alpha = image.convert("RGBA").getchannel("A")
+        if alpha.getextrema()[0] < 255:
+            return False
+    return image.getcolors(maxcolors=PHOTO_COLOR_THRESHOLD) is None
+
+
+def prepare_image(
+    file_bytes: bytes,
+    mime_type: str,
+    max_dimension: int,
+    jpeg_quality: int,
+    png_to_jpeg: bool = True,
+) -> PreparedImage:
+    """
+    Downscales an image to max_dimension on its long side, recompresses it,
+    and strips EXIF/metadata (after applying the EXIF orientation).
+    Falls back to the original bytes if the image cannot be decoded, exceeds
+    Pillow's decompression-bomb limit, or the re-encoded version is larger and
+    carried no metadata worth stripping.
+    """
+    original = PreparedImage(file_bytes, mime_type, len(file_bytes), len(file_bytes))
+
+    try:
+        image = Image.open(io.BytesIO(file_bytes))
+        image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        return original
+
+    source_format = image.format
+    had_metadata = bool(image.info.get("exif")) or bool(image.getexif())
+    image = ImageOps.exif_transpose(image)
+
+    resized = False
+    if max_dimension > 0 and max(image.size) > max_dimension:
+        image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+        resized = True
+
+    is_jpeg_source = source_format == "JPEG" or mime_type in ("image/jpeg", "image/jpg")
+    buffer = io.BytesIO()
+    if is_jpeg_source or (png_to_jpeg and _is_photographic(image)):
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.save(buffer, format="JPEG", quality=jpeg_quality, optimize=True)
+        prepared_mime = "image/jpeg"
+    else:
+        image.save(buffer, format="PNG", optimize=True)
+        prepared_mime = "image/png"
+
+    data = buffer.getvalue()
+    if len(data) >= len(file_bytes) and not resized and not had_metadata:
+        return original
+
+    return PreparedImage(data, prepared_mime, len(file_bytes), len(data))
+
+
+def record_prepared(prepared: PreparedImage):
+    """Accumulates process-wide byte savings for the metrics endpoint."""
+    with _stats_lock:
+        _stats["files"] += 1
+        _stats["original_bytes"] += prepared.original_bytes
+        _stats["prepared_bytes"] += prepared.prepared_bytes
+
+
+def prep_stats() -> Dict[str, int]:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["bytes_saved"] = stats["original_bytes"] - stats["prepared_bytes"]
+    return stats
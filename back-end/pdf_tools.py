@@ -0,0 +1,104 @@
+import hashlib
+import io
+import os
+from typing import Iterable, List, NamedTuple
+
+from pypdf import PdfReader, PdfWriter
+
+
+def extract_page_texts(pdf_reader: PdfReader) -> List[str]:
+    """
+    Returns the native text layer of every page, whitespace-normalized within
+    each line. Line breaks are kept so repeated headers and footers can be
+    detected later; blank lines are dropped so pages stay single blocks.
+    """
+    page_texts = []
+    for page in pdf_reader.pages:
+        try:
+            text = page.extract_text() or ""
+        except Exception:
+            # A single malformed page should not discard the rest of the document
+            text = ""
+        lines = (" ".join(line.split()) for line in text.splitlines())
+        page_texts.append("\n".join(line for line in lines if line))
+    return page_texts
+
+
+def split_page(pdf_reader: PdfReader, page_index: int) -> bytes:
+    """Copies a single page into a standalone PDF and returns its bytes."""
+    writer = PdfWriter()
+    writer.add_page(pdf_reader.pages[page_index])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+class EmbeddedImage(NamedTuple):
+    page_index: int
+    name: str
+    data: bytes
+    mime_type: str
+
+
+# Formats Gemini accepts as-is; anything else (TIFF, JPX, raw bitmaps) is re-encoded as PNG.
+_PASSTHROUGH_MIME_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
+
+
+def extract_embedded_images(
+    pdf_reader: PdfReader,
+    skip_pages: Iterable[int] = (),
+    min_bytes: int = 0,
+    min_dimension: int = 0,
+) -> List[EmbeddedImage]:
+    """
+    Pulls embedded raster images out of the PDF via pypdf's page image API.
+    Images smaller than min_bytes or whose short side is below min_dimension
+    (logos, icons, rules) are skipped, and exact duplicates are kept only once.
+    """
+    skip = set(skip_pages)
+    seen_digests = set()
+    extracted = []
+
+    for page_index, page in enumerate(pdf_reader.pages):
+        if page_index in skip:
+            continue
+
+        try:
+            page_images = page.images
+            image_count = len(page_images)
+        except Exception:
+            continue
+
+        for image_index in range(image_count):
+            try:
+                image_file = page_images[image_index]
+                data = image_file.data
+                if len(data) < min_bytes:
+                    continue
+                if min(image_file.image.size) < min_dimension:
+                    continue
+
+                digest = hashlib.sha256(data).hexdigest()
+                if digest in seen_digests:
+                    continue
+                seen_digests.add(digest)
+
+                extension = os.path.splitext(image_file.name)[1].lower()
+                mime_type = _PASSTHROUGH_MIME_TYPES.get(extension)
+                if mime_type is None:
+                    image = image_file.image
+                    if image.mode not in ("1", "L", "LA", "RGB", "RGBA"):
+                        image = image.convert("RGB")
+                    buffer = io.BytesIO()
+                    image.save(buffer, format="PNG")
+                    data = buffer.getvalue()
+                    mime_type = "image/png"
+            except Exception:
+                # Undecodable images are skipped rather than failing the document
+                continue
+
+            extracted.append(
+                EmbeddedImage(page_index, image_file.name, data, mime_type)
+            )
+
+    return extracted
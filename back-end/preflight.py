@@ -0,0 +1,293 @@
+import hashlib
+import io
+import math
+import struct
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from PIL import Image, UnidentifiedImageError
+from pypdf import PdfReader
+
+from pdf_tools import extract_page_texts
+from tokens import (
+    TOKENS_PER_PDF_PAGE,
+    estimate_audio_tokens,
+    estimate_image_tokens,
+    estimate_tokens,
+)
+
+
+class PlannerSettings(NamedTuple):
+    native_text_threshold: int
+    image_extraction: bool
+    image_min_bytes: int
+    image_min_dimension: int
+    image_max_dimension: int
+    audio_chunking: bool
+    segment_seconds: float
+    overlap_seconds: float
+    concurrency: int
+    seconds_per_call: float
+    output_tokens_per_call: int
+    input_usd_per_mtok: float
+    audio_input_usd_per_mtok: float
+    output_usd_per_mtok: float
+    warn_pages: int
+    max_pages: int
+    max_calls: int
+
+
+# ISO-BMFF major brands of audio-only files. HEIC photos and MP4/MOV video
+# share the ftyp box, and generic brands (isom, mp42) are left to the extension.
+AUDIO_BRANDS = {b"M4A ", b"M4B ", b"M4P ", b"F4A ", b"F4B "}
+
+
+def sniff_file_type(head: bytes) -> Tuple[str, Optional[str]]:
+    """Identifies a file from its leading bytes; returns (kind, mime_type)."""
+    if b"%PDF-" in head[:1024]:
+        return "pdf", "application/pdf"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image", "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image", "image/jpeg"
+    if head[4:8] == b"ftyp" and head[8:12] in AUDIO_BRANDS:
+        return "audio", "audio/m4a"
+    return "unsupported", None
+
+
+def detect_media_type(file_name: str, head: bytes) -> Tuple[str, Optional[str]]:
+    """Sniffs the file type from magic bytes, falling back to the file extension."""
+    kind, mime_type = sniff_file_type(head)
+    if kind != "unsupported":
+        return kind, mime_type
+
+    file_extension = file_name.lower().split(".")[-1]
+    if file_extension == "pdf":
+        return "pdf", "application/pdf"
+    if file_extension == "m4a":
+        return "audio", "audio/m4a"
+    if file_extension in ["png", "jpg", "jpeg"]:
+        return "image", "image/png" if file_extension == "png" else "image/jpeg"
+    return "unsupported", None
+
+
+def _mp4_boxes(data, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    offset = start
+    while offset + 8 <= end:
+        size, kind = struct.unpack(">I4s", data[offset : offset + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", data[offset + 8 : offset + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return
+        yield kind, offset + header, offset + size
+        offset += size
+
+
+def mp4_duration(data) -> Optional[float]:
+    """Reads the duration of an MP4/M4A container from its moov/mvhd box."""
+    try:
+        for kind, body, end in _mp4_boxes(data, 0, len(data)):
+            if kind != b"moov":
+                continue
+            for child, child_body, _ in _mp4_boxes(data, body, end):
+                if child != b"mvhd":
+                    continue
+                if data[child_body] == 1:
+                    timescale, duration = struct.unpack(
+                        ">IQ", data[child_body + 20 : child_body + 32]
+                    )
+                else:
+                    timescale, duration = struct.unpack(
+                        ">II", data[child_body + 12 : child_body + 20]
+                    )
+                return duration / timescale if timescale else None
+    except struct.error:
+        return None
+    return None
+
+
+def _scaled_size(width: int, height: int, max_dimension: int) -> Tuple[int, int]:
+    if max_dimension <= 0 or max(width, height) <= max_dimension:
+        return width, height
+    scale = max_dimension / max(width, height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def _plan_pdf(data, settings: PlannerSettings, plan: Dict[str, Any]):
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        page_texts = extract_page_texts(reader)
+    except Exception:
+        # Unreadable container: ingestion sends the whole file to Gemini
+        plan.update(pages=None, gemini_calls=1, upload_bytes=len(data))
+        plan["input_tokens"] = TOKENS_PER_PDF_PAGE
+        return
+
+    scanned = [i for i, t in enumerate(page_texts) if len(t) <= settings.native_text_threshold]
+    bytes_per_page = len(data) // max(1, len(page_texts))
+
+    image_count = 0
+    photo_tokens = 0
+    photo_bytes = 0
+    photo_count = 0
+    seen_digests = set()
+    for page_index, page in enumerate(reader.pages):
+        # The same page image API and filters as pdf_tools.extract_embedded_images
+        try:
+            page_images = page.images
+            page_image_count = len(page_images)
+        except Exception:
+            continue
+        image_count += page_image_count
+        if not settings.image_extraction or page_index in scanned:
+            continue
+        for image_index in range(page_image_count):
+            try:
+                image_file = page_images[image_index]
+                image_bytes = len(image_file.data)
+                if image_bytes < settings.image_min_bytes:
+                    continue
+                width, height = image_file.image.size
+                if min(width, height) < settings.image_min_dimension:
+                    continue
+                digest = hashlib.sha256(image_file.data).hexdigest()
+            except Exception:
+                continue
+            if digest in seen_digests:
+                continue
+            seen_digests.add(digest)
+            photo_count += 1
+            photo_bytes += image_bytes
+            photo_tokens += estimate_image_tokens(
+                *_scaled_size(width, height, settings.image_max_dimension)
+            )
+
+    native_text = "\n\n".join(t for i, t in enumerate(page_texts) if i not in scanned)
+    plan.update(
+        pages=len(page_texts),
+        native_text_pages=len(page_texts) - len(scanned),
+        scanned_pages=len(scanned),
+        images=image_count,
+        photo_images=photo_count,
+        gemini_calls=len(scanned) + photo_count,
+        upload_bytes=len(scanned) * bytes_per_page + photo_bytes,
+        input_tokens=len(scanned) * TOKENS_PER_PDF_PAGE + photo_tokens,
+        text_tokens=estimate_tokens(native_text),
+    )
+
+
+def _plan_audio(data, settings: PlannerSettings, plan: Dict[str, Any]):
+    seconds = mp4_duration(data)
+    segments = 1
+    if seconds and settings.audio_chunking and seconds > settings.segment_seconds + settings.overlap_seconds:
+        step = max(1.0, settings.segment_seconds - settings.overlap_seconds)
+        segments = math.ceil((seconds - settings.overlap_seconds) / step)
+    plan.update(
+        audio_seconds=round(seconds, 1) if seconds else None,
+        segments=segments,
+        gemini_calls=segments,
+        upload_bytes=len(data),
+        input_tokens=estimate_audio_tokens(seconds or 0),
+    )
+
+
+def _plan_image(data, settings: PlannerSettings, plan: Dict[str, Any]):
+    try:
+        # Image.open only parses the header; pixels are never decoded here
+        width, height = Image.open(io.BytesIO(data)).size
+    except (UnidentifiedImageError, OSError):
+        width, height = 0, 0
+    scaled = _scaled_size(width, height, settings.image_max_dimension)
+    plan.update(
+        width=width,
+        height=height,
+        gemini_calls=1,
+        upload_bytes=len(data),
+        input_tokens=estimate_image_tokens(*scaled),
+    )
+
+
+def plan_file(file_name: str, data, settings: PlannerSettings, cached: bool = False) -> Dict[str, Any]:
+    """Inspects one file without calling any model and estimates its ingestion cost."""
+    kind, mime_type = detect_media_type(file_name, bytes(data[:1024]))
+    plan: Dict[str, Any] = {
+        "file": file_name,
+        "type": kind,
+        "mime_type": mime_type,
+        "bytes": len(data),
+        "cached": cached,
+        "gemini_calls": 0,
+        "upload_bytes": 0,
+        "input_tokens": 0,
+        "text_tokens": 0,
+    }
+
+    if kind == "pdf":
+        _plan_pdf(data, settings, plan)
+    elif kind == "audio":
+        _plan_audio(data, settings, plan)
+    elif kind == "image":
+        _plan_image(data, settings, plan)
+
+    if cached:
+        # Served from the extraction cache: no model calls at ingestion time
+        plan.update(gemini_calls=0, upload_bytes=0, input_tokens=0)
+    return plan
+
+
+def summarize_plan(files: List[Dict[str, Any]], settings: PlannerSettings) -> Dict[str, Any]:
+    """Totals per-file plans into call, byte, token, cost, and latency estimates."""
+    calls = sum(f["gemini_calls"] for f in files)
+    audio_tokens = sum(f["input_tokens"] for f in files if f["type"] == "audio")
+    media_tokens = sum(f["input_tokens"] for f in files) - audio_tokens
+    output_tokens = calls * settings.output_tokens_per_call
+    pages = sum(f.get("pages") or 0 for f in files)
+
+    # Base64 inflates every inline upload by a third
+    upload_bytes = sum(math.ceil(f["upload_bytes"] * 4 / 3) for f in files)
+    cost = (
+        media_tokens * settings.input_usd_per_mtok
+        + audio_tokens * settings.audio_input_usd_per_mtok
+        + output_tokens * settings.output_usd_per_mtok
+    ) / 1_000_000
+    waves = math.ceil(calls / max(1, settings.concurrency)) if calls else 0
+
+    warnings = []
+    if settings.warn_pages and pages > settings.warn_pages:
+        warnings.append(f"{pages} PDF pages exceed the warning threshold of {settings.warn_pages}.")
+    for f in files:
+        if f["type"] == "unsupported":
+            warnings.append(f"{f['file']} is not a supported PDF, M4A, PNG, or JPEG file.")
+
+    admitted = True
+    if settings.max_pages and pages > settings.max_pages:
+        admitted = False
+        warnings.append(f"{pages} PDF pages exceed the limit of {settings.max_pages}.")
+    if settings.max_calls and calls > settings.max_calls:
+        admitted = False
+        warnings.append(f"{calls} Gemini calls exceed the limit of {settings.max_calls}.")
+
+    return {
+        "files": files,
+        "totals": {
+            "files": len(files),
+            "pages": pages,
+            "native_text_pages": sum(f.get("native_text_pages") or 0 for f in files),
+            "images": sum(f.get("images") or 0 for f in files)
+            + sum(1 for f in files if f["type"] == "image"),
+            "audio_seconds": round(sum(f.get("audio_seconds") or 0 for f in files), 1),
+            "gemini_calls": calls,
+            "input_bytes": sum(f["bytes"] for f in files),
+            "upload_bytes": upload_bytes,
+            "input_tokens": media_tokens + audio_tokens,
+            "output_tokens": output_tokens,
+            "text_tokens": sum(f["text_tokens"] for f in files),
+        },
+        "estimated_cost_usd": round(cost, 4),
+        "estimated_seconds": round(waves * settings.seconds_per_call, 1),
+        "warnings": warnings,
+        "admitted": admitted,
+    }
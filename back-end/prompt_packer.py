@@ -0,0 +1,123 @@
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from tokens import CHARS_PER_TOKEN, estimate_tokens
+
+# Share of a truncated section kept from its start; the rest comes from its end,
+# where totals, signatures, and conclusions usually sit.
+HEAD_SHARE = 0.7
+MIN_SECTION_TOKENS = 64
+
+Summarizer = Callable[[str, int], Optional[str]]
+
+
+class PackedPrompt(NamedTuple):
+    prior: str
+    documents: List[str]
+    report: List[Dict[str, object]]
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.prior) + sum(estimate_tokens(d) for d in self.documents)
+
+
+def truncate_middle(text: str, max_tokens: int) -> str:
+    """Keeps the head and tail of text within max_tokens, marking what was omitted."""
+    max_chars = max(0, max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    marker = "\n[... {} characters omitted to fit the prompt budget ...]\n"
+    keep = max(0, max_chars - len(marker.format(len(text))))
+    head_end = int(keep * HEAD_SHARE)
+    tail_start = len(text) - (keep - head_end)
+    # Prefer cutting at line breaks so entries are not split mid-line
+    newline = text.rfind("\n", 0, head_end)
+    if newline > head_end // 2:
+        head_end = newline
+    newline = text.find("\n", tail_start, len(text))
+    if newline != -1 and newline - tail_start < (len(text) - tail_start) // 2:
+        tail_start = newline + 1
+    return text[:head_end] + marker.format(tail_start - head_end) + text[tail_start:]
+
+
+def allocate_budgets(sizes: List[int], budget: int) -> List[int]:
+    """
+    Water-fill allocation: sections smaller than an even share keep their full
+    size and the leftover is split between the larger ones.
+    """
+    budgets = [0] * len(sizes)
+    remaining = budget
+    pending = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    while pending:
+        share = remaining // len(pending)
+        index = pending[0]
+        if sizes[index] <= share:
+            budgets[index] = sizes[index]
+            remaining -= sizes[index]
+            pending.pop(0)
+            continue
+        for index in pending:
+            budgets[index] = max(share, 0)
+        break
+    return budgets
+
+
+def _fit(text: str, budget: int, summarize: Optional[Summarizer]) -> Tuple[str, str]:
+    if estimate_tokens(text) <= budget:
+        return text, "kept"
+    if summarize is not None:
+        summary = summarize(text, budget)
+        if summary and estimate_tokens(summary) <= budget:
+            return summary, "summarized"
+    return truncate_middle(text, budget), "truncated"
+
+
+def pack_prompt(
+    prior: str,
+    documents: List[str],
+    ceiling: int,
+    overhead: str = "",
+    prior_share: float = 0.25,
+    summarize: Optional[Summarizer] = None,
+) -> PackedPrompt:
+    """
+    Fits a stage prompt under ceiling tokens. The prior summary is budgeted
+    first (up to prior_share of the room), then the documents split what is
+    left. A ceiling of 0 disables packing.
+    """
+    prior_tokens = estimate_tokens(prior)
+    document_tokens = [estimate_tokens(d) for d in documents]
+    report: List[Dict[str, object]] = []
+
+    room = ceiling - estimate_tokens(overhead)
+    if ceiling <= 0 or prior_tokens + sum(document_tokens) <= room:
+        return PackedPrompt(prior, list(documents), report)
+
+    room = max(room, MIN_SECTION_TOKENS * (len(documents) + 1))
+    prior_budget = min(prior_tokens, max(MIN_SECTION_TOKENS, int(room * prior_share)))
+    # Room the documents do not need goes back to the prior summary
+    document_budget = room - prior_budget
+    if sum(document_tokens) < document_budget:
+        prior_budget = room - sum(document_tokens)
+        document_budget = sum(document_tokens)
+
+    packed_prior, action = _fit(prior, prior_budget, None)
+    if action != "kept":
+        report.append(
+            {"section": "prior summary", "tokens": prior_tokens, "budget": prior_budget, "action": action}
+        )
+
+    packed_documents = []
+    budgets = allocate_budgets(document_tokens, document_budget)
+    for document, tokens, budget in zip(documents, document_tokens, budgets):
+        packed, action = _fit(document, max(budget, MIN_SECTION_TOKENS), summarize)
+        packed_documents.append(packed)
+        if action != "kept":
+            report.append(
+                {
+                    "section": document.split("\n", 1)[0][:120],
+                    "tokens": tokens,
+                    "budget": budget,
+                    "action": action,
+                }
+            )
+    return PackedPrompt(packed_prior, packed_documents, report)
@@ -0,0 +1,213 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+
+class SharedRateLimiter:
+    """
+    Token buckets for requests per minute and tokens per minute, stored in
+    SQLite so every thread and every worker process on the host draws from
+    the same quota. Each acquisition is one BEGIN IMMEDIATE transaction:
+    refill both buckets for the elapsed time, then take from both or neither.
+    A limit of 0 leaves that bucket unlimited.
+    """
+
+    def __init__(self, db_path: str, name: str, rpm: int = 0, tpm: int = 0):
+        self.db_path = db_path
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self._local = threading.local()
+        self._stats = {"acquired": 0, "waits": 0, "wait_seconds": 0.0}
+        self._stats_lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS buckets (
+                name TEXT PRIMARY KEY,
+                level REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        conn.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rpm > 0 or self.tpm > 0
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite handles cross-process locking."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _refill(
+        self, conn: sqlite3.Connection, bucket: str, per_minute: int, now: float
+    ) -> float:
+        row = conn.execute(
+            "SELECT level, updated_at FROM buckets WHERE name = ?", (bucket,)
+        ).fetchone()
+        if row is None:
+            return float(per_minute)
+        level, updated_at = row
+        return min(float(per_minute), level + max(0.0, now - updated_at) * per_minute / 60.0)
+
+    def _store(self, conn: sqlite3.Connection, bucket: str, level: float, now: float):
+        conn.execute(
+            "INSERT INTO buckets (name, level, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET level = excluded.level, updated_at = excluded.updated_at",
+            (bucket, level, now),
+        )
+
+    def try_acquire(self, tokens: int) -> float:
+        """
+        Takes one request and `tokens` estimated tokens if both buckets allow it.
+        Returns 0 on success, otherwise the seconds to wait before trying again.
+        """
+        if not self.enabled:
+            return 0.0
+        limits = []
+        if self.rpm > 0:
+            limits.append((f"{self.name}:requests", self.rpm, 1.0))
+        if self.tpm > 0:
+            # A request larger than the whole bucket waits for a full bucket
+            limits.append((f"{self.name}:tokens", self.tpm, float(min(tokens, self.tpm))))
+
+        conn = self._conn()
+        # Wall-clock time, since monotonic clocks are not comparable across processes
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            levels = [self._refill(conn, bucket, limit, now) for bucket, limit, _ in limits]
+            wait = max(
+                (need - level) * 60.0 / limit
+                for (_, limit, need), level in zip(limits, levels)
+            )
+            if wait <= 0:
+                for (bucket, _, need), level in zip(limits, levels):
+                    self._store(conn, bucket, level - need, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return max(0.0, wait)
+
+    def adjust(self, tokens: int):
+        """Returns (or charges) the difference between estimated and actual tokens."""
+        if self.tpm <= 0 or not tokens:
+            return
+        conn = self._conn()
+        now = time.time()
+        bucket = f"{self.name}:tokens"
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            level = self._refill(conn, bucket, self.tpm, now)
+            self._store(conn, bucket, min(float(self.tpm), level + tokens), now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def acquire(self, tokens: int):
+        """Waits (without blocking the event loop) until the request fits the quota."""
+        if not self.enabled:
+            return
+        waited = 0.0
+        while True:
+            wait = await asyncio.to_thread(self.try_acquire, tokens)
+            if wait <= 0:
+                break
+            wait = min(wait, 5.0)
+            waited += wait
+            await asyncio.sleep(wait)
+        with self._stats_lock:
+            self._stats["acquired"] += 1
+            if waited:
+                self._stats["waits"] += 1
+                self._stats["wait_seconds"] += waited
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["wait_seconds"] = round(stats["wait_seconds"], 2)
+        return dict(stats, rpm=self.rpm, tpm=self.tpm)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on in-flight requests for use on one event loop: each success
+    adds 1/limit (about +1 per round trip of the whole window), and a 429
+    halves the limit, at most once per cooldown so one burst of throttled
+    responses counts as a single signal.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        initial: Optional[int] = None,
+        decrease_factor: float = 0.5,
+        cooldown_seconds: float = 2.0,
+    ):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(initial or self.max_limit)
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition: Optional[asyncio.Condition] = None
+        self._stats = {"throttled": 0, "decreases": 0}
+
+    def _cond(self) -> asyncio.Condition:
+        # Created lazily so it binds to the loop that uses it
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def __aenter__(self):
+        condition = self._cond()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        condition = self._cond()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    def on_success(self):
+        self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def on_throttle(self) -> Tuple[float, bool]:
+        """Records a 429; returns (new limit, whether it was decreased)."""
+        self._stats["throttled"] += 1
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown_seconds:
+            return self.limit, False
+        self._last_decrease = now
+        self._stats["decreases"] += 1
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        return self.limit, True
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(
+            self._stats,
+            limit=round(self.limit, 2),
+            max_limit=self.max_limit,
+            in_flight=self.in_flight,
+        )
@@ -0,0 +1,168 @@
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Set for requests that asked for a forced refresh; read wherever the cache is consulted
+_bypass: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "response_cache_bypass", default=False
+)
+
+
+def set_bypass(enabled: bool) -> contextvars.Token:
+    return _bypass.set(enabled)
+
+
+def reset_bypass(token: contextvars.Token):
+    _bypass.reset(token)
+
+
+def bypass_requested(headers) -> bool:
+    """True for "X-Cache-Bypass: 1" or "Cache-Control: no-cache" request headers."""
+    if headers.get("X-Cache-Bypass", "").strip().lower() in ("1", "true", "yes"):
+        return True
+    cache_control = headers.get("Cache-Control", "").lower()
+    return "no-cache" in cache_control or "no-store" in cache_control
+
+
+class ResponseCache:
+    """
+    Cache for deterministic model calls, keyed by model, system instruction,
+    generation config, and a hash of the contents. An in-memory LRU sits in
+    front of an optional SQLite tier that survives restarts; entries expire
+    after ttl_seconds in both. A bypassed lookup skips the read but still
+    stores the fresh response.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 86400, disk_path: str = ""):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0}
+
+        if disk_path:
+            directory = os.path.dirname(disk_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = self._conn()
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+            conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite handles cross-process locking."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.disk_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(model: str, payload: Dict[str, Any]) -> str:
+        instruction = json.dumps(payload.get("systemInstruction"), sort_keys=True)
+        config = json.dumps(payload.get("generationConfig"), sort_keys=True)
+        contents_digest = hashlib.sha256(
+            json.dumps(payload.get("contents"), sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        return hashlib.sha256(
+            f"{model}\x00{instruction}\x00{config}\x00{contents_digest}".encode("utf-8")
+        ).hexdigest()
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _remember(self, key: str, expires_at: float, content: str):
+        with self._lock:
+            self._memory[key] = (expires_at, content)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+
+        if self.disk_path:
+            try:
+                row = self._conn().execute(
+                    "SELECT content, expires_at FROM responses WHERE key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row is not None:
+                self._remember(key, row[1], row[0])
+                self._count("disk_hits")
+                return row[0]
+
+        self._count("misses")
+        return None
+
+    def put(self, key: str, content: str):
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, expires_at, content)
+        if self.disk_path:
+            try:
+                conn = self._conn()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, content, expires_at) VALUES (?, ?, ?)",
+                    (key, content, expires_at),
+                )
+                conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+                conn.commit()
+            except sqlite3.Error:
+                # The disk tier is an optimization; the memory tier already has the entry
+                pass
+
+    def lookup(self, model: str, payload: Dict[str, Any]) -> Optional[str]:
+        """Cached response for a payload, or None on a miss or a bypassed request."""
+        if _bypass.get():
+            self._count("bypassed")
+            return None
+        return self.get(self.make_key(model, payload))
+
+    def store(self, model: str, payload: Dict[str, Any], content: str):
+        """Caches a response; empty responses are not stored."""
+        if content:
+            self.put(self.make_key(model, payload), content)
+
+    def get_or_call(self, model: str, payload: Dict[str, Any], call: Callable[[], str]) -> str:
+        """Returns a cached response unless the request bypasses the cache."""
+        cached = self.lookup(model, payload)
+        if cached is not None:
+            return cached
+        content = call()
+        self.store(model, payload, content)
+        return content
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._memory))
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+        return stats
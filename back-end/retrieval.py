@@ -0,0 +1,118 @@
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, NamedTuple, Tuple
+
+from case_digest import chunk_text
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have he her his i in is it its of on or "
+    "she that the their they this to was were will with you".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS and len(t) > 1]
+
+
+class Chunk(NamedTuple):
+    doc_id: str
+    label: str
+    position: int
+    count: int
+    text: str
+
+
+class BM25Index:
+    """
+    In-process Okapi BM25 index over the chunks of a case's documents.
+    Documents are added as they are ingested; term statistics are kept
+    incrementally so the index is reused by every later stage of the case.
+    """
+
+    def __init__(self, chunk_tokens: int = 400, k1: float = 1.5, b: float = 0.75):
+        self.chunk_tokens = chunk_tokens
+        self.k1 = k1
+        self.b = b
+        self._chunks: List[Chunk] = []
+        self._term_counts: List[Counter] = []
+        self._lengths: List[int] = []
+        self._document_frequency: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._chunks)
+
+    def clear(self):
+        with self._lock:
+            self._chunks.clear()
+            self._term_counts.clear()
+            self._lengths.clear()
+            self._document_frequency.clear()
+
+    def add_document(self, doc_id: str, label: str, text: str) -> int:
+        """Chunks and indexes a document; returns the number of chunks added."""
+        chunks = chunk_text(text, self.chunk_tokens)
+        tokenized = [Counter(tokenize(chunk)) for chunk in chunks]
+        with self._lock:
+            for position, (chunk, counts) in enumerate(zip(chunks, tokenized)):
+                self._chunks.append(Chunk(doc_id, label, position, len(chunks), chunk))
+                self._term_counts.append(counts)
+                self._lengths.append(sum(counts.values()))
+                for term in counts:
+                    self._document_frequency[term] = self._document_frequency.get(term, 0) + 1
+        return len(chunks)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[float, Chunk]]:
+        """Returns up to top_k (score, chunk) pairs with a positive score, best first."""
+        terms = set(tokenize(query))
+        with self._lock:
+            total = len(self._chunks)
+            if not total or not terms:
+                return []
+            average_length = sum(self._lengths) / total
+            idf = {
+                term: math.log(1 + (total - df + 0.5) / (df + 0.5))
+                for term in terms
+                if (df := self._document_frequency.get(term, 0))
+            }
+            scored = []
+            for chunk, counts, length in zip(self._chunks, self._term_counts, self._lengths):
+                score = 0.0
+                for term, weight in idf.items():
+                    frequency = counts.get(term, 0)
+                    if frequency:
+                        norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                        score += weight * frequency * (self.k1 + 1) / (frequency + norm)
+                if score > 0:
+                    scored.append((score, chunk))
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return scored[:top_k]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "chunks": len(self._chunks),
+                "documents": len({c.doc_id for c in self._chunks}),
+                "terms": len(self._document_frequency),
+            }
+
+
+def render_excerpts(results: List[Tuple[float, Chunk]], doc_order: List[str]) -> List[str]:
+    """Groups retrieved chunks by document, in case order and reading order."""
+    by_document: Dict[str, List[Chunk]] = {}
+    for _, chunk in results:
+        by_document.setdefault(chunk.doc_id, []).append(chunk)
+
+    sections = []
+    for doc_id in doc_order:
+        chunks = sorted(by_document.get(doc_id, []), key=lambda c: c.position)
+        if not chunks:
+            continue
+        positions = ", ".join(str(c.position + 1) for c in chunks)
+        header = f"--- EXCERPTS ({chunks[0].label}; parts {positions} of {chunks[0].count}) ---"
+        sections.append(header + "\n" + "\n[...]\n".join(c.text for c in chunks))
+    return sections
@@ -0,0 +1,277 @@
+import contextvars
+import email.utils
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, Type
+
+import requests
+
+# Absolute time.monotonic() deadline of the current request, if any
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget is too small for another upstream attempt."""
+
+
+class CircuitOpenError(Exception):
+    """The upstream failed repeatedly and calls are short-circuited for a while."""
+
+
+def set_deadline(seconds: float) -> contextvars.Token:
+    """Starts a time budget for the current context; never extends an outer one."""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    return _deadline.set(deadline)
+
+
+def start_request_deadline(seconds: float) -> contextvars.Token:
+    """Sets a fresh budget, replacing any deadline left over on a reused thread."""
+    return _deadline.set(time.monotonic() + seconds)
+
+
+def reset_deadline(token: contextvars.Token):
+    _deadline.reset(token)
+
+
+@contextmanager
+def request_deadline(seconds: float) -> Iterator[None]:
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        reset_deadline(token)
+
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def remaining_seconds(deadline: Optional[float] = None) -> Optional[float]:
+    deadline = current_deadline() if deadline is None else deadline
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def propagate_context(fn: Callable) -> Callable:
+    """
+    Wraps fn so pool threads run it in a copy of the caller's context, which
+    carries the request deadline along. A fresh copy per call, since one
+    context cannot be entered by two threads at once.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+def iterate_in_context(iterator: Iterator[Any]) -> Iterator[Any]:
+    """
+    Advances iterator in a copy of the caller's context, so a streamed
+    response body still sees the request's deadline, cache bypass, and case
+    after the view has returned and its context is gone.
+    """
+    context = contextvars.copy_context()
+
+    def run() -> Iterator[Any]:
+        while True:
+            try:
+                item = context.run(next, iterator)
+            except StopIteration:
+                return
+            yield item
+
+    return run()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class RetryPolicy:
+    """
+    Decorrelated-jitter backoff (sleep = uniform(base, previous * 3), capped)
+    that honors Retry-After and gives up once the remaining deadline cannot
+    fit the wait plus another useful attempt.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        attempt_timeout: float = 120.0,
+        min_attempt_seconds: float = 5.0,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempt_timeout = attempt_timeout
+        self.min_attempt_seconds = min_attempt_seconds
+
+    def attempt_timeout_for(self, deadline: Optional[float]) -> float:
+        """Per-attempt timeout, cut to the remaining budget; raises if none is left."""
+        remaining = remaining_seconds(deadline)
+        if remaining is None:
+            return self.attempt_timeout
+        if remaining < self.min_attempt_seconds:
+            raise DeadlineExceeded(f"Only {max(0.0, remaining):.1f}s left in the request budget.")
+        return min(self.attempt_timeout, remaining)
+
+    def next_delay(
+        self,
+        attempt: int,
+        previous_delay: float,
+        retry_after: Optional[float],
+        deadline: Optional[float],
+        max_attempts: Optional[int] = None,
+    ) -> Optional[float]:
+        """Delay before the next attempt, or None if the request should not be retried."""
+        if attempt + 1 >= (max_attempts or self.max_attempts):
+            return None
+        upper = max(self.base_delay, previous_delay * 3)
+        delay = min(self.max_delay, random.uniform(self.base_delay, upper))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        remaining = remaining_seconds(deadline)
+        if remaining is not None and remaining - delay < self.min_attempt_seconds:
+            return None
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and fails fast for
+    reset_seconds; then lets one probe through (half-open) and closes again
+    on its success.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._short_circuited = 0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raises CircuitOpenError unless the call may go to the upstream."""
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at >= self.reset_seconds and not self._probing:
+                self._probing = True
+                return
+            self._short_circuited += 1
+        raise CircuitOpenError(f"{self.name} circuit is open after repeated failures.")
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def record_cancelled(self):
+        """Releases the half-open probe of a call that ended without an outcome."""
+        with self._lock:
+            self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if self._probing else "open"
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            failures, short_circuited = self._failures, self._short_circuited
+        return {
+            "state": self.state,
+            "consecutive_failures": failures,
+            "short_circuited": short_circuited,
+        }
+
+
+def send_with_retry(
+    send: Callable[[float], requests.Response],
+    policy: RetryPolicy,
+    breaker: Optional[CircuitBreaker] = None,
+    retry_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504),
+    retry_exceptions: Tuple[Type[BaseException], ...] = (requests.exceptions.ConnectionError,),
+) -> requests.Response:
+    """
+    Runs send(timeout) under the policy. Server errors and retry_exceptions
+    count against the breaker; 429 does not, since throttling is not an outage.
+    The last response is returned even if its status is an error.
+    """
+    deadline = current_deadline()
+    delay = policy.base_delay
+    attempt = 0
+    while True:
+        timeout = policy.attempt_timeout_for(deadline)
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            response = send(timeout)
+        except retry_exceptions:
+            if breaker is not None:
+                breaker.record_failure()
+            delay = policy.next_delay(attempt, delay, None, deadline)
+            if delay is None:
+                raise
+        except Exception:
+            # Timeouts and other errors are not retried (the call may have run),
+            # but they still count against the upstream
+            if breaker is not None:
+                breaker.record_failure()
+            raise
+        except BaseException:
+            if breaker is not None:
+                breaker.record_cancelled()
+            raise
+        else:
+            if response.status_code >= 500 and breaker is not None:
+                breaker.record_failure()
+            elif breaker is not None:
+                breaker.record_success()
+            if response.status_code not in retry_statuses:
+                return response
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            delay = policy.next_delay(attempt, delay, retry_after, deadline)
+            if delay is None:
+                return response
+        time.sleep(delay)
+        attempt += 1
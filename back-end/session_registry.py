@@ -0,0 +1,49 @@
+import threading
+import time
+from typing import Any, Dict, Hashable
+
+import requests
+
+
+def session_missing(response: requests.Response) -> bool:
+    """True for the ADK server's 404 for a run against an unknown session."""
+    return response.status_code == 404 and "session not found" in response.text.lower()
+
+
+class SessionRegistry:
+    """
+    ADK sessions known to exist, so runs can skip the create-session round
+    trip. Entries expire after ttl_seconds and are then re-verified; a run
+    that fails with session-not-found (e.g. after an ADK server restart)
+    forgets its session so it is created again.
+    """
+
+    def __init__(self, ttl_seconds: float = 3600.0):
+        self.ttl_seconds = ttl_seconds
+        self._known: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def is_known(self, key: Hashable) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._known.get(key)
+            if expires_at is not None and expires_at > now:
+                self._stats["hits"] += 1
+                return True
+            self._known.pop(key, None)
+            self._stats["misses"] += 1
+            return False
+
+    def mark(self, key: Hashable):
+        with self._lock:
+            self._known[key] = time.monotonic() + self.ttl_seconds
+
+    def forget(self, key: Hashable):
+        with self._lock:
+            if self._known.pop(key, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, sessions=len(self._known), ttl_seconds=self.ttl_seconds)
@@ -0,0 +1,82 @@
+import base64
+import json
+import mmap
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Union
+
+# Stand-in for the inlineData "data" field; replaced by the streamed base64 text.
+INLINE_DATA_PLACEHOLDER = "__INLINE_DATA__"
+
+# Raw bytes encoded per chunk; a multiple of 3 so chunks concatenate into valid base64.
+DEFAULT_CHUNK_BYTES = 3 * 256 * 1024
+
+MediaBuffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+
+class InlineDataBody:
+    """
+    JSON request body for a Gemini payload with one inline media part.
+    The payload is serialized once with a placeholder where the base64 data
+    goes; iterating the body yields the JSON prefix, the media encoded chunk by
+    chunk straight from the buffer, then the JSON suffix. Peak memory is bounded
+    by the chunk size instead of the media size, and the body can be iterated
+    again for retries, synchronously or asynchronously.
+    """
+
+    def __init__(
+        self,
+        payload: Dict[str, Any],
+        media: MediaBuffer,
+        chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    ):
+        encoded = json.dumps(payload)
+        prefix, marker, suffix = encoded.partition(json.dumps(INLINE_DATA_PLACEHOLDER))
+        if not marker:
+            raise ValueError("Payload does not contain the inline data placeholder.")
+
+        # Base64 output never needs JSON escaping, so the quotes stay outside the stream
+        self._prefix = (prefix + '"').encode("utf-8")
+        self._suffix = ('"' + suffix).encode("utf-8")
+        # Slicing (rather than holding a memoryview) copies one chunk at a time and
+        # leaves no exported buffer that would stop an mmap from being closed
+        self._media = media
+        self._chunk_bytes = max(3, chunk_bytes - chunk_bytes % 3)
+
+    @property
+    def media_bytes(self) -> int:
+        return len(self._media)
+
+    @property
+    def text_bytes(self) -> int:
+        """Size of the JSON around the media (prompts and instructions)."""
+        return len(self._prefix) + len(self._suffix)
+
+    def __len__(self) -> int:
+        encoded_media = 4 * ((len(self._media) + 2) // 3)
+        return len(self._prefix) + encoded_media + len(self._suffix)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self._prefix
+        for offset in range(0, len(self._media), self._chunk_bytes):
+            yield base64.b64encode(self._media[offset : offset + self._chunk_bytes])
+        yield self._suffix
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        # Same chunks for async HTTP clients; each iteration starts over, so retries work
+        for chunk in self:
+            yield chunk
+
+
+@contextmanager
+def open_media(path: str) -> Iterator[MediaBuffer]:
+    """Memory-maps a file read-only; empty files yield b"" since they cannot be mapped."""
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield b""
+            return
+        try:
+            yield mapped
+        finally:
+            mapped.close()
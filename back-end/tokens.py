@@ -0,0 +1,28 @@
+import math
+
+# Local token estimates for Gemini inputs. These follow the published Gemini
+# accounting (258 tokens per image tile or PDF page, 32 tokens per second of
+# audio) and a ~4 characters per token rule of thumb for text.
+CHARS_PER_TOKEN = 4
+TOKENS_PER_IMAGE_TILE = 258
+IMAGE_TILE_PIXELS = 768
+SMALL_IMAGE_PIXELS = 384
+TOKENS_PER_PDF_PAGE = 258
+AUDIO_TOKENS_PER_SECOND = 32
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of a text without calling the model."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """Images up to 384px on both sides cost one tile; larger ones are tiled at 768px."""
+    if width <= SMALL_IMAGE_PIXELS and height <= SMALL_IMAGE_PIXELS:
+        return TOKENS_PER_IMAGE_TILE
+    tiles = math.ceil(width / IMAGE_TILE_PIXELS) * math.ceil(height / IMAGE_TILE_PIXELS)
+    return tiles * TOKENS_PER_IMAGE_TILE
+
+
+def estimate_audio_tokens(seconds: float) -> int:
+    return int(math.ceil(seconds * AUDIO_TOKENS_PER_SECOND))
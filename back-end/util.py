@@ -1,19 +1,37 @@
 import shutil
+import tempfile
+from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
 import os
 
 
-def save_files(files):
+def save_files(files, folder="media"):
     print(files)
     for file in files:
         filename = secure_filename(file.filename)
         # 2. Save the file temporarily
-        file_path = os.path.join("media", filename)
+        file_path = os.path.join(folder, filename)
         file.save(file_path)
 
 
-def nuke_files():
-    if os.path.exists("./media"):
-        shutil.rmtree("./media")
+def detach_files(files):
+    """
+    Copies uploads out of the request, which closes its own files when the
+    view returns, for use by a response that streams after that.
+    """
+    detached = []
+    for file in files:
+        stream = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        shutil.copyfileobj(file.stream, stream)
+        stream.seek(0)
+        detached.append(
+            FileStorage(stream, filename=file.filename, name=file.name, content_type=file.content_type)
+        )
+    return detached
+
+
+def nuke_files(folder="./media"):
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
 
-    os.mkdir("./media")
+    os.makedirs(folder)
@@ -14,6 +14,8 @@ import {
 } from "~/lib/atom";
 import { useContext } from "react";
 import StepContext from "~/lib/context";
+import { caseHeaders } from "~/lib/case";
+import { streamStage } from "~/lib/stream";
 
 const API_URL = import.meta.env.VITE_API_URL as string;
 
@@ -27,7 +29,18 @@ export default function Continue() {
   const onClick = async () => {
     setLoadingDataAtom(true);
 
-    const [text, ok] = await apiReq(trueStep, files);
+    const showText = (text: string) => {
+      // The first streamed text replaces the overlay with the live output
+      setLoadingDataAtom(false);
+      setStepOutputs((prev) => {
+        const copy = [...prev];
+
+        copy[trueStep - 1] = text;
+        return copy;
+      });
+    };
+
+    const [text, ok] = await apiReq(trueStep, files, showText);
 
     setLoadingDataAtom(false);
 
@@ -66,18 +79,22 @@ export default function Continue() {
   );
 }
 
-async function apiReq(step: number, files: File[]): Promise<[string, boolean]> {
+async function apiReq(
+  step: number,
+  files: File[],
+  onText: (text: string) => void
+): Promise<[string, boolean]> {
   const formData = new FormData();
   for (let file of files) {
     formData.append("files[]", file);
   }
 
-  const res = await fetch(`${API_URL}/${step}`, {
-    method: "POST",
-    body: formData,
-  });
-
-  const data: Record<string, string> = await res.json();
+  const data = await streamStage(
+    `${API_URL}/${step}/stream`,
+    formData,
+    await caseHeaders(step),
+    onText
+  );
   const text = data.result;
   if (!data.good) {
     console.error(text);
@@ -109,6 +109,7 @@ import {
 } from "~/lib/atom";
 import { useContext } from "react";
 import StepContext from "~/lib/context";
+import { caseHeaders } from "~/lib/case";
 
 const API_URL = import.meta.env.VITE_API_URL as string;
 
@@ -169,6 +170,7 @@ async function apiReq(files: File[]): Promise<[string, boolean]> {
   const res = await fetch(`${API_URL}/${4}`, {
     method: "POST",
     body: formData,
+    headers: await caseHeaders(4),
   });
 
   const data: Record<string, string> = await res.json();
@@ -13,6 +13,8 @@ export const stepAtom = atom(4);
 
 export const stepOutputsAtom = atom<string[]>(["", "", "", ""]);
 export const loadingDataAtom = atom(false);
+// Case issued by the API at stage 1, sent with every later stage
+export const caseIdAtom = atom("");
 
 export const reportPartsAtom = atom<string[]>(["A", "B", "C", "D", "E"]);
 export const reportDataAtom = atom<Record<string, any>>({});
@@ -0,0 +1,17 @@
+import { getDefaultStore } from "jotai";
+import { caseIdAtom } from "./atom";
+
+const API_URL = import.meta.env.VITE_API_URL as string;
+
+// Stage 1 starts a new case; later stages reuse its ID. Without one the
+// server falls back to its shared default case.
+export async function caseHeaders(step: number): Promise<Record<string, string>> {
+  const store = getDefaultStore();
+  if (step === 1) {
+    const res = await fetch(`${API_URL}/cases`, { method: "POST" });
+    const data: Record<string, string> = await res.json();
+    store.set(caseIdAtom, data.case_id);
+  }
+  const caseId = store.get(caseIdAtom);
+  return caseId ? { "X-Case-Id": caseId } : {};
+}
@@ -0,0 +1,54 @@
+// Reads a stage's Server-Sent Events stream (POST /<step>/stream).
+// onText gets the text so far: the agent's draft first, then the markdown
+// version as it is formatted. Resolves with the stored stage record.
+export async function streamStage(
+  url: string,
+  body: FormData,
+  headers: Record<string, string>,
+  onText: (text: string) => void
+): Promise<Record<string, string>> {
+  const res = await fetch(url, { method: "POST", body, headers });
+  if (!res.ok || !res.body) {
+    throw new Error(`Stream request failed: ${res.status}`);
+  }
+
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = "";
+  let phase = "";
+  let text = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+
+    let end: number;
+    while ((end = buffer.indexOf("\n\n")) !== -1) {
+      const block = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+
+      let event = "message";
+      let data = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      }
+      if (!data) continue;
+      const payload = JSON.parse(data);
+
+      if (event === "token") {
+        if (payload.phase !== phase) {
+          phase = payload.phase;
+          text = "";
+        }
+        text += payload.text;
+        onText(text);
+      } else if (event === "result") {
+        return payload;
+      } else if (event === "error") {
+        throw new Error(payload.message);
+      }
+    }
+  }
+  throw new Error("Stream ended without a result");
+}